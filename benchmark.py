@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+ChirpStack CSV Importer - Benchmark du serveur local
+Lance un faux ChirpStack (latence et erreurs configurables) et server.py dans le
+meme processus, puis mesure le debit des operations de masse.
+
+Usage:
+    python benchmark.py                          # 10000 devices, 5 ms de latence
+    python benchmark.py --devices 2000 --latency 20 --error-rate 0.01
+    python benchmark.py --workloads import,export --json resultats.json
+"""
+
+import argparse
+import http.server
+import json
+import os
+import random
+import re
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+
+WORKLOADS = ('import', 'reimport', 'list', 'export', 'proxy', 'delete')
+APPLICATION_ID = 'bench-app'
+DEVICE_PROFILE_ID = '00000000-0000-0000-0000-000000000001'
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class FakeChirpStack:
+    """In-memory stand-in for the ChirpStack REST API (devices, keys, applications, device profiles)"""
+
+    def __init__(self, latency=0.005, jitter=0.0, error_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.devices = {}  # devEui -> device
+        self.keys = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.list_requests = 0  # GET /api/devices (listing pages)
+        self.injected_errors = 0
+        self.httpd = None
+
+    def start(self):
+        fake = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like the REST gateway
+
+            def log_message(self, format, *args):
+                pass
+
+            def reply(self, status, data):
+                body = json.dumps(data).encode('utf-8')
+                # Status line, headers and body in one write (no Nagle / delayed ACK stall)
+                head = (f'HTTP/1.1 {status} {self.responses.get(status, ("",))[0]}\r\n'
+                        f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n')
+                self.wfile.write(head.encode('latin-1') + body)
+
+            def handle_method(self, method):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}') if length else {}
+                with fake.lock:
+                    fake.requests += 1
+                time.sleep(fake.latency + random.uniform(0, fake.jitter))
+                if fake.error_rate and random.random() < fake.error_rate:
+                    with fake.lock:
+                        fake.injected_errors += 1
+                    return self.reply(503, {'code': 14, 'message': 'injected error'})
+                status, data = fake.route(method, self.path, body)
+                self.reply(status, data)
+
+            def do_GET(self):
+                self.handle_method('GET')
+
+            def do_POST(self):
+                self.handle_method('POST')
+
+            def do_PUT(self):
+                self.handle_method('PUT')
+
+            def do_DELETE(self):
+                self.handle_method('DELETE')
+
+        class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+            daemon_threads = True
+            request_queue_size = 128
+
+        self.httpd = Server(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def route(self, method, url, body):
+        parsed = urlparse(url)
+        path = parsed.path
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        not_found = (404, {'code': 5, 'message': 'Object does not exist'})
+
+        if path == '/api/devices' and method == 'GET':
+            application_id = query.get('applicationId') or query.get('application_id')
+            with self.lock:
+                self.list_requests += 1
+                items = [d for d in self.devices.values() if d['applicationId'] == application_id]
+            offset, limit = int(query.get('offset', 0)), int(query.get('limit', 10))
+            result = [{'devEui': d['devEui'], 'name': d['name'], 'description': d['description'],
+                       'deviceProfileId': d['deviceProfileId'], 'deviceProfileName': 'Bench profile',
+                       'tags': d['tags'], 'createdAt': d['createdAt'], 'lastSeenAt': None}
+                      for d in items[offset:offset + limit]]
+            return 200, {'totalCount': len(items), 'result': result}
+        if path == '/api/devices' and method == 'POST':
+            device = body.get('device') or {}
+            dev_eui = (device.get('devEui') or device.get('dev_eui') or '').lower()
+            with self.lock:
+                if dev_eui in self.devices:
+                    return 409, {'code': 6, 'message': 'Object already exists'}
+                self.devices[dev_eui] = {
+                    'devEui': dev_eui, 'name': device.get('name', ''), 'description': device.get('description', ''),
+                    'applicationId': device.get('applicationId') or device.get('application_id'),
+                    'deviceProfileId': device.get('deviceProfileId') or device.get('device_profile_id'),
+                    'tags': device.get('tags') or {}, 'variables': device.get('variables') or {},
+                    'createdAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+                }
+            return 200, {}
+
+        match = re.match(r'^/api/devices/([0-9a-fA-F]{16})(/keys)?$', path)
+        if match:
+            dev_eui = match.group(1).lower()
+            with self.lock:
+                if match.group(2):
+                    if method == 'GET':
+                        return (200, {'deviceKeys': self.keys[dev_eui]}) if dev_eui in self.keys else not_found
+                    if method in ('POST', 'PUT'):
+                        keys = body.get('deviceKeys') or body.get('device_keys') or {}
+                        self.keys[dev_eui] = {'nwkKey': keys.get('nwkKey') or keys.get('nwk_key') or '',
+                                              'appKey': keys.get('appKey') or keys.get('app_key') or ''}
+                        return 200, {}
+                    self.keys.pop(dev_eui, None)
+                    return 200, {}
+                device = self.devices.get(dev_eui)
+                if device is None:
+                    return not_found
+                if method == 'GET':
+                    return 200, {'device': device, 'createdAt': device['createdAt']}
+                if method == 'PUT':
+                    device.update({k: v for k, v in (body.get('device') or {}).items() if k in device})
+                    return 200, {}
+                if method == 'DELETE':
+                    del self.devices[dev_eui]
+                    self.keys.pop(dev_eui, None)
+                    return 200, {}
+
+        if path == '/api/applications' and method == 'GET':
+            return 200, {'totalCount': 1, 'result': [{'id': APPLICATION_ID, 'name': 'Bench'}]}
+        if path == '/api/device-profiles' and method == 'GET':
+            return 200, {'totalCount': 1, 'result': [{'id': DEVICE_PROFILE_ID, 'name': 'Bench profile'}]}
+        return 404, {'code': 5, 'message': 'Not found'}
+
+
+class Bench:
+    """Drives the local server (ProxyHandler) the way main.html does and times each workload"""
+
+    def __init__(self, server, base_url, chirpstack_url, devices, concurrency):
+        self.server = server
+        self.base_url = base_url
+        self.chirpstack_url = chirpstack_url
+        self.devices = devices
+        self.concurrency = concurrency
+        self.dev_euis = [f'{0x70B3D50000000000 + i:016x}' for i in range(devices)]
+
+    def call(self, path, body=None, method=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method or ('POST' if data else 'GET'))
+        request.add_header('Content-Type', 'application/json')
+        request.add_header('Grpc-Metadata-Authorization', 'Bearer bench')
+        request.add_header('X-Chirpstack-Url', self.chirpstack_url)
+        with urllib.request.urlopen(request, timeout=600) as response:
+            return response.read()
+
+    def run(self, name):
+        """Run one workload -> result dict (items, seconds, throughput, latencies)"""
+        self.server.proxy_metrics = self.server.ProxyMetrics(window=10 ** 7)
+        inventory_loads = self.server.device_inventories.loads
+        started = time.monotonic()
+        items, errors, latencies = getattr(self, f'workload_{name}')()
+        seconds = time.monotonic() - started
+
+        upstream = [v for recent, _, _ in self.server.proxy_metrics.upstream_latency.values() for v in recent]
+        calls = sum(self.server.proxy_metrics.upstream_requests.values())
+        result = {'workload': name, 'items': items, 'errors': errors, 'seconds': round(seconds, 3),
+                  'itemsPerSecond': round(items / seconds, 1) if seconds else None,
+                  'upstreamCalls': calls, 'inventoryLoads': self.server.device_inventories.loads - inventory_loads}
+        for label, values in (('latency', latencies), ('upstream', upstream)):
+            for q in (0.5, 0.95, 0.99):
+                value = percentile(values, q)
+                result[f'{label}P{int(q * 100)}Ms'] = round(value * 1000, 1) if value is not None else None
+        return result
+
+    @staticmethod
+    def import_rows(dev_euis):
+        return [{'row': i + 2,
+                 'device': {'application_id': APPLICATION_ID, 'name': f'bench-{i}', 'description': '',
+                            'dev_eui': dev_eui, 'device_profile_id': DEVICE_PROFILE_ID,
+                            'tags': {'site': f'site-{i % 10}'}},
+                 'keys': {'dev_eui': dev_eui, 'nwk_key': f'{i:032x}'}}
+                for i, dev_eui in enumerate(dev_euis)]
+
+    def workload_import(self):
+        """POST /api/import with every device (and its keys) in one request"""
+        rows = self.import_rows(self.dev_euis)
+        started = time.monotonic()
+        response = json.loads(self.call('/api/import', {'devices': rows, 'concurrency': self.concurrency}))
+        return len(rows), response['errors'], [time.monotonic() - started]
+
+    def workload_reimport(self):
+        """Import job with existing=update, like the import page: the same file plus as many new devices.
+
+        The application should be listed once per job (see the Listes column), not once per created device.
+        """
+        new_euis = [f'{0x70B3D60000000000 + i:016x}' for i in range(self.devices)]
+        rows = self.import_rows(self.dev_euis + new_euis)
+        self.dev_euis += new_euis  # Removed by the delete workload
+        job = json.loads(self.call('/api/jobs', {'kind': 'import', 'items': rows, 'concurrency': self.concurrency,
+                                                 'params': {'existing': 'update', 'applicationId': APPLICATION_ID}}))
+        return len(rows), self.wait_job(job['id'], len(rows))['errors'], []
+
+    def workload_list(self):
+        """Full device listing through the inventory (refresh=1, pages of 1000)"""
+        latencies, offset, total, refresh = [], 0, None, '&refresh=1'
+        while total is None or offset < total:
+            started = time.monotonic()
+            data = json.loads(self.call(f'/api/inventory?applicationId={APPLICATION_ID}'
+                                        f'&offset={offset}&limit=1000{refresh}'))
+            latencies.append(time.monotonic() - started)
+            total, refresh = data['totalCount'], ''
+            offset += len(data['result'])
+            if not data['result']:
+                break
+        return offset, 0, latencies
+
+    def workload_export(self):
+        """Streamed CSV export with keys (GET /api/export?keys=1)"""
+        started = time.monotonic()
+        content = self.call(f'/api/export?applicationId={APPLICATION_ID}&format=csv&keys=1')
+        rows = content.count(b'\n') - 1
+        missing_keys = content.count(b'"";""\n')  # Empty nwk_key and app_key columns
+        return rows, missing_keys, [time.monotonic() - started]
+
+    def workload_proxy(self):
+        """Proxied GET /api/devices/{devEui} from 8 browser-like clients"""
+        sample = self.dev_euis[:min(len(self.dev_euis), 2000)]
+
+        def get(dev_eui):
+            started = time.monotonic()
+            try:
+                self.call(f'/proxy/{self.chirpstack_url}/api/devices/{dev_eui}')
+                return time.monotonic() - started, False
+            except urllib.error.HTTPError:
+                return time.monotonic() - started, True
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(get, sample))
+        return len(sample), sum(1 for _, failed in results if failed), [t for t, _ in results]
+
+    def workload_delete(self):
+        """Bulk delete job (POST /api/jobs kind=delete), polled until finished"""
+        items = [{'devEui': dev_eui} for dev_eui in self.dev_euis]
+        job = json.loads(self.call('/api/jobs', {'kind': 'delete', 'items': items, 'params': {},
+                                                 'concurrency': self.concurrency}))
+        summary = self.wait_job(job['id'], len(items))
+        return summary['total'], summary['errors'], []
+
+    def wait_job(self, job_id, total):
+        """Poll a job until it ends -> its summary"""
+        while True:
+            summary = json.loads(self.call(f"/api/jobs/{job_id}?from={total}"))
+            if summary['status'] in self.server.JOB_FINAL_STATUSES:
+                return summary
+            time.sleep(0.1)
+
+
+def print_report(results, args):
+    print('')
+    print(f"  {args.devices} devices, latence ChirpStack {args.latency} ms"
+          f" (+{args.jitter} ms), erreurs injectees {args.error_rate:.1%}, concurrence {args.concurrency}")
+    print('')
+    header = f"  {'Workload':<8} {'Items':>7} {'Err':>5} {'Duree (s)':>10} {'Items/s':>9} " \
+             f"{'Appels':>7} {'Listes':>6} {'Amont p50':>10} {'p95':>7} {'p99':>7} {'Req p50':>9} {'p95':>7} {'p99':>7}"
+    print(header)
+    print('  ' + '-' * (len(header) - 2))
+
+    def ms(value):
+        return '-' if value is None else f'{value:g}'
+
+    for r in results:
+        print(f"  {r['workload']:<8} {r['items']:>7} {r['errors']:>5} {r['seconds']:>10} {ms(r['itemsPerSecond']):>9} "
+              f"{r['upstreamCalls']:>7} {r['inventoryLoads']:>6} {ms(r['upstreamP50Ms']):>10} {ms(r['upstreamP95Ms']):>7} {ms(r['upstreamP99Ms']):>7} "
+              f"{ms(r['latencyP50Ms']):>9} {ms(r['latencyP95Ms']):>7} {ms(r['latencyP99Ms']):>7}")
+    print('')
+    print('  Amont = appels server.py -> ChirpStack, Req = requetes navigateur -> server.py (ms)')
+    print("  Listes = chargements complets de la liste des devices d'une application")
+    print('')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de server.py contre un faux ChirpStack local')
+    parser.add_argument('--devices', type=int, default=10000, help='Nombre de devices (defaut: 10000)')
+    parser.add_argument('--latency', type=float, default=5, help='Latence du faux ChirpStack en ms (defaut: 5)')
+    parser.add_argument('--jitter', type=float, default=0, help='Latence aleatoire supplementaire en ms (defaut: 0)')
+    parser.add_argument('--error-rate', type=float, default=0, help='Part des appels en erreur 503 (defaut: 0)')
+    parser.add_argument('--concurrency', type=int, default=None, help='Concurrence des imports / jobs (defaut: IMPORT_CONCURRENCY)')
+    parser.add_argument('--rate-limit', type=float, default=0,
+                        help='RATE_LIMIT_MAX du serveur (defaut: 0 = limiteur desactive)')
+    parser.add_argument('--workloads', default=','.join(WORKLOADS),
+                        help=f"Workloads a lancer, dans l'ordre (defaut: {','.join(WORKLOADS)})")
+    parser.add_argument('--json', help='Ecrit aussi les resultats dans ce fichier JSON')
+    args = parser.parse_args()
+
+    workloads = [w.strip() for w in args.workloads.split(',') if w.strip()]
+    unknown = [w for w in workloads if w not in WORKLOADS]
+    if unknown:
+        parser.error(f"workload(s) inconnu(s): {', '.join(unknown)}")
+
+    # server.py reads its configuration at import time
+    data_dir = tempfile.mkdtemp(prefix='chirpstack-bench-')
+    os.environ['DATA_DIR'] = data_dir
+    os.environ['RATE_LIMIT_MAX'] = str(args.rate_limit)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sys.argv = sys.argv[:1]  # server.py also reads its port from sys.argv
+    import server
+
+    fake = FakeChirpStack(args.latency / 1000, args.jitter / 1000, args.error_rate)
+    chirpstack_url = fake.start()
+
+    # Defined here: server can only be imported once DATA_DIR / RATE_LIMIT_MAX are set
+    class QuietHandler(server.ProxyHandler):
+        def log_message(self, format, *args):
+            pass
+
+    httpd = server.ThreadPoolHTTPServer(('127.0.0.1', 0), QuietHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    server.job_manager.start()
+
+    bench = Bench(server, f'http://127.0.0.1:{httpd.server_address[1]}', chirpstack_url, args.devices,
+                  args.concurrency or server.IMPORT_CONCURRENCY)
+    args.concurrency = bench.concurrency
+    results = []
+    try:
+        for name in workloads:
+            print(f'  {name}...', flush=True)
+            results.append(bench.run(name))
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        server.job_manager.stop()
+        fake.stop()
+
+    print_report(results, args)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'injectedErrors': fake.injected_errors,
+                       'upstreamRequests': fake.requests, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
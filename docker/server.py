@@ -8,25 +8,116 @@ Adaptations Docker:
   - allow_reuse_address pour éviter les erreurs au redémarrage
 """
 
+import bisect
+import contextlib
+import csv
+import gzip
+import hashlib
+import http.client
 import http.server
+import io
+import itertools
+import math
+import operator
 import socketserver
-import urllib.request
-import urllib.error
 import json
+import re
+import shutil
+import ssl
 import sys
 import os
+import queue
+import signal
+import tempfile
+import threading
+import time
 import uuid
-from datetime import datetime
-from urllib.parse import urlparse, parse_qs
+import zipfile
+import zlib
+import xml.etree.ElementTree as ET
+try:
+    import grpc
+    from chirpstack_api import api as chirpstack_api
+    from google.protobuf import json_format
+except ImportError:  # Optional: pip install grpcio chirpstack-api
+    grpc = None
+try:
+    import sqlite3
+except ImportError:  # Python built without SQLite: JSON files only
+    sqlite3 = None
+try:
+    import brotli
+except ImportError:  # Optional: pip install brotli (gzip only without it)
+    brotli = None
+from array import array
+from xml.sax.saxutils import escape as xml_escape
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs, quote
 
 # Configuration
 PORT = int(os.environ.get('PORT', sys.argv[1] if len(sys.argv) > 1 else 8000))
 HOST = os.environ.get('HOST', '0.0.0.0')  # Docker: écoute sur toutes les interfaces
 DATA_DIR = os.environ.get('DATA_DIR', '/app/data')
+MAX_WORKERS = int(os.environ.get('MAX_WORKERS', 32))  # Requetes traitees en parallele
+MAX_STREAMS = int(os.environ.get('MAX_STREAMS', 8))  # Flux longs simultanes (SSE des jobs, export, import), en plus des workers
+STREAM_RETRY_DELAY = 5  # Secondes avant de reessayer quand tous les flux sont pris
+UPSTREAM_TIMEOUT = 30  # Timeout des appels vers ChirpStack (secondes)
+POOL_MAX_SIZE = int(os.environ.get('POOL_MAX_SIZE', 16))  # Connexions inactives gardees par hote
+POOL_IDLE_TIMEOUT = float(os.environ.get('POOL_IDLE_TIMEOUT', 60))  # Secondes avant fermeture
+IMPORT_CONCURRENCY = int(os.environ.get('IMPORT_CONCURRENCY', 8))  # Appels ChirpStack paralleles par import
+IMPORT_MAX_CONCURRENCY = 32
+IMPORT_PLAN_FIELDS = (('name', 'name'), ('description', 'description'), ('deviceProfileId', 'device_profile_id'), ('tags', 'tags'))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))  # Jobs executes simultanement
+RATE_LIMIT_INITIAL = float(os.environ.get('RATE_LIMIT_INITIAL', 20))  # Requetes/s vers ChirpStack au demarrage
+RATE_LIMIT_MAX = float(os.environ.get('RATE_LIMIT_MAX', 200))  # Plafond en requetes/s (0 = pas de limite)
+RATE_LIMIT_MIN = 1.0
+RATE_LIMIT_STEP = 10.0  # Hausse du debit (req/s) par seconde de trafic sain
+RATE_LIMIT_OVERLOAD_STATUSES = (429, 503, 504)
+GRPC_TARGET = os.environ.get('GRPC_TARGET', '')  # API gRPC pour les devices: vide (REST), auto, ou hote:port
+GRPC_PORT = int(os.environ.get('GRPC_PORT', 8080))  # Port gRPC de ChirpStack quand GRPC_TARGET=auto
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # Histogramme /metrics (secondes)
+METRICS_WINDOW = 1024  # Derniers appels ChirpStack utilises pour p50/p95/p99
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))  # Octets minimum avant compression gzip / brotli (0 = desactive)
+COMPRESS_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+STATIC_CACHE_MAX_SIZE = 10 * 1024 * 1024  # Fichiers statiques plus gros servis depuis le disque, sans compression
+OVERLOAD_RETRIES = 3  # Nouvelles tentatives d'un appel serveur refuse pour surcharge
+OVERLOAD_RETRY_POST_STATUSES = (429, 503)  # Refus avant traitement: un POST (non idempotent) n'est rejoue que sur ceux-la
+INVENTORY_TTL = float(os.environ.get('INVENTORY_TTL', 300))  # Secondes avant rechargement d'une liste de devices
+INVENTORY_MAX_PAGE_SIZE = 1000
+INVENTORY_PAGE_SIZE = min(int(os.environ.get('INVENTORY_PAGE_SIZE', 500)), INVENTORY_MAX_PAGE_SIZE)  # Devices par page ChirpStack
+INVENTORY_PREFETCH = int(os.environ.get('INVENTORY_PREFETCH', 8))  # Pages demandees en parallele
+INVENTORY_MAX_LIMIT = 10000  # Taille de page maximale de /api/inventory
+PROXY_CACHE_TTL = float(os.environ.get('PROXY_CACHE_TTL', 60))  # Secondes de cache des tenants / applications / device profiles (0 = desactive)
+PROXY_CACHE_MAX_ENTRIES = int(os.environ.get('PROXY_CACHE_MAX_ENTRIES', 500))  # Reponses gardees au maximum
+PROXY_CACHE_PATH = re.compile(r'^/api/(tenants|applications|device-profiles)(/[^/]+)?$')
+PROXY_CHUNK_SIZE = 64 * 1024  # Octets relayes par envoi; corps de requete plus gros transmis en streaming
+INVENTORY_SORT_FIELDS = ('name', 'devEui', 'description', 'deviceProfileName', 'lastSeenAt', 'createdAt', 'updatedAt')
+SEARCH_REFRESH_INTERVAL = float(os.environ.get('SEARCH_REFRESH_INTERVAL', 60))  # Secondes entre deux mises a jour de l'index
+SEARCH_MAX_RESULTS = 200
+DASHBOARD_TTL = float(os.environ.get('DASHBOARD_TTL', 30))  # Secondes de cache du tableau de bord
+DASHBOARD_CONCURRENCY = 8  # Applications chargees en parallele
+DASHBOARD_ACTIVE_HOURS = 24  # Seuil actif / inactif (comme ChirpStack)
+LINK_METRICS_RETENTION_HOURS = int(os.environ.get('LINK_METRICS_RETENTION_HOURS', 7 * 24))  # Historique horaire garde par device
+LINK_METRICS_PERIODS = {'24h': 24, '7d': 7 * 24}
+LINK_METRICS_COLUMNS = ('rx', 'errors', 'rssi', 'snr')
+LINK_METRICS_SORTS = ('loss', 'rssi', 'snr', 'errors')
+PARSE_CHUNK_ROWS = 1000  # Lignes par message de /api/parse
+PARSE_SEPARATORS = (';', ',', '\t')
+EXPORT_KEY_CONCURRENCY = int(os.environ.get('EXPORT_KEY_CONCURRENCY', 16))  # Cles recuperees en parallele par export
+EXPORT_FLUSH_ROWS = 500  # Lignes ecrites vers le navigateur par envoi
+EXPORT_TICKET_TTL = 60  # Secondes de validite d'un lien de telechargement
+EXPORT_COLUMNS = ['dev_eui', 'name', 'description', 'device_profile_id', 'device_profile_name', 'created_at', 'last_seen_at']
 
 # Chemins des fichiers de données
 PROFILES_FILE = os.path.join(DATA_DIR, 'profiles.json')
 SERVERS_FILE = os.path.join(DATA_DIR, 'servers.json')
+JOBS_DIR = os.path.join(DATA_DIR, 'jobs')
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'json').lower()  # Profils et serveurs: json ou sqlite
+STORAGE_DB = os.path.join(DATA_DIR, 'chirpstack_import.db')  # Base utilisee si STORAGE_BACKEND=sqlite
+MIGRATION_JOURNAL = os.path.join(DATA_DIR, 'migrations.jsonl')
+LINK_METRICS_DIR = os.path.join(DATA_DIR, 'link-metrics')  # Metriques radio collectees (un fichier par application)
 
 
 def ensure_data_dir():
@@ -36,50 +127,2801 @@ def ensure_data_dir():
         print(f"[INFO] Dossier de données créé: {DATA_DIR}")
 
 
-def load_profiles():
-    """Load profiles from JSON file"""
-    if not os.path.exists(PROFILES_FILE):
-        return {"profiles": []}
+class RecordStore:
+    """Profiles or saved servers, kept in memory and persisted on every change.
+
+    Reads (list, lookup by id) never touch the disk. Changes are made under a lock
+    and written either to the JSON file - temp file + rename, so a crash leaves the
+    previous or the new version, never half of it - or, with STORAGE_BACKEND=sqlite,
+    to a table of STORAGE_DB (an existing JSON file is imported on first use).
+    """
+
+    def __init__(self, collection, json_path, backend=STORAGE_BACKEND, db_path=STORAGE_DB):
+        self.collection = collection
+        self.json_path = json_path
+        self.backend = backend if backend != 'sqlite' or sqlite3 is not None else 'json'
+        self.db_path = db_path
+        self._records = None  # id -> record (insertion order), loaded on first use
+        self._lock = threading.RLock()
+
+    def _read_json(self):
+        if not os.path.exists(self.json_path):
+            return []
+        try:
+            with open(self.json_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get(self.collection, [])
+        except (json.JSONDecodeError, IOError, AttributeError):
+            return []
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        db = sqlite3.connect(self.db_path)
+        db.execute(f'CREATE TABLE IF NOT EXISTS "{self.collection}" (id TEXT PRIMARY KEY, data TEXT NOT NULL)')
+        return db
+
+    def _load(self):
+        if self._records is not None:
+            return
+        if self.backend == 'sqlite':
+            db = self._connect()
+            try:
+                records = [json.loads(data) for (data,) in
+                           db.execute(f'SELECT data FROM "{self.collection}" ORDER BY rowid')]
+                if not records:
+                    records = self._read_json()
+                    with db:
+                        db.executemany(f'INSERT INTO "{self.collection}" (id, data) VALUES (?, ?)',
+                                       [(r['id'], json.dumps(r, ensure_ascii=False)) for r in records])
+            finally:
+                db.close()
+        else:
+            records = self._read_json()
+        self._records = OrderedDict((r['id'], r) for r in records if isinstance(r, dict) and 'id' in r)
+
+    def _persist(self, record_id):
+        """Write the change made to `record_id` (record saved or removed)"""
+        if self.backend == 'sqlite':
+            db = self._connect()
+            try:
+                with db:
+                    record = self._records.get(record_id)
+                    if record is None:
+                        db.execute(f'DELETE FROM "{self.collection}" WHERE id = ?', (record_id,))
+                    else:
+                        db.execute(f'INSERT INTO "{self.collection}" (id, data) VALUES (?, ?) '
+                                   'ON CONFLICT(id) DO UPDATE SET data = excluded.data',
+                                   (record_id, json.dumps(record, ensure_ascii=False)))
+            finally:
+                db.close()
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.json_path)), exist_ok=True)
+        tmp_path = self.json_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({self.collection: list(self._records.values())}, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.json_path)
+
+    def list(self):
+        with self._lock:
+            self._load()
+            return [dict(r) for r in self._records.values()]
+
+    def get(self, record_id):
+        with self._lock:
+            self._load()
+            record = self._records.get(record_id)
+            return dict(record) if record is not None else None
+
+    def add(self, record, unique_field=None):
+        """Store a new record. Returns False (nothing stored) if `unique_field` is already taken."""
+        with self._lock:
+            self._load()
+            if unique_field and any(r.get(unique_field) == record.get(unique_field)
+                                    for r in self._records.values()):
+                return False
+            self._records[record['id']] = dict(record)
+            self._persist(record['id'])
+            return True
+
+    def update(self, record_id, changes):
+        """Apply `changes` to a record -> updated copy, or None if unknown"""
+        with self._lock:
+            self._load()
+            record = self._records.get(record_id)
+            if record is None:
+                return None
+            record.update(changes)
+            self._persist(record_id)
+            return dict(record)
+
+    def delete(self, record_id):
+        with self._lock:
+            self._load()
+            if self._records.pop(record_id, None) is None:
+                return False
+            self._persist(record_id)
+            return True
+
+
+profile_store = RecordStore('profiles', PROFILES_FILE)
+server_store = RecordStore('servers', SERVERS_FILE)
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose rate is tuned by AIMD from upstream feedback.
+
+    The rate grows by `step` req/s per second of saturated, healthy traffic and
+    is halved (at most once per second) on 429/503/504 or timeouts. Growth
+    pauses while the smoothed latency is more than twice the best observed.
+    """
+
+    LATENCY_TOLERANCE = 2.0
+    BACKOFF_INTERVAL = 1.0
+
+    def __init__(self, initial_rate=RATE_LIMIT_INITIAL, min_rate=RATE_LIMIT_MIN,
+                 max_rate=RATE_LIMIT_MAX, step=RATE_LIMIT_STEP):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.step = step
+        self.rate = max(min_rate, min(initial_rate, max_rate))
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.last_backoff = 0.0
+        self.latency = None  # EWMA, seconds
+        self.best_latency = None
+        self.requests = 0
+        self.throttled = 0
+        self.backoffs = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        burst = max(1.0, self.rate / 10)  # 100 ms worth of requests
+        self.tokens = min(burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Block until a request may be sent (reserves a token, possibly in the future)"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            delay = max(-self.tokens / self.rate, self.blocked_until - now, 0)
+            self.requests += 1
+            if delay > 0:
+                self.throttled += 1
+        if delay > 0:
+            time.sleep(delay)
+
+    def record(self, latency, overloaded, retry_after=None):
+        """Feed back the outcome of a request"""
+        with self._lock:
+            now = time.monotonic()
+            if overloaded:
+                if retry_after:
+                    self.blocked_until = max(self.blocked_until, now + min(retry_after, 60))
+                if now - self.last_backoff >= self.BACKOFF_INTERVAL:
+                    # Concurrent failures of the same burst only count once
+                    self.rate = max(self.min_rate, self.rate / 2)
+                    self.last_backoff = now
+                    self.backoffs += 1
+                return
+
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            if self.best_latency is None or self.latency < self.best_latency:
+                self.best_latency = self.latency
+            else:
+                # Let the baseline follow a lasting slowdown
+                self.best_latency += (self.latency - self.best_latency) * 0.01
+
+            self._refill(now)
+            # Only grow while the limit is what holds traffic back
+            if self.tokens < 1 and self.latency <= self.LATENCY_TOLERANCE * self.best_latency:
+                self.rate = min(self.max_rate, self.rate + self.step / self.rate)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'rate': round(self.rate, 2),
+                'latencyMs': round(self.latency * 1000, 1) if self.latency is not None else None,
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'backoffs': self.backoffs
+            }
+
+
+class RateLimiterRegistry:
+    """One AdaptiveRateLimiter per upstream (scheme, host, port)"""
+
+    def __init__(self):
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Limiter for an upstream, or None when rate limiting is disabled"""
+        if RATE_LIMIT_MAX <= 0:
+            return None
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = self._limiters[key] = AdaptiveRateLimiter()
+            return limiter
+
+    def get_stats(self):
+        with self._lock:
+            limiters = list(self._limiters.items())
+        return {
+            'initialRate': RATE_LIMIT_INITIAL,
+            'maxRate': RATE_LIMIT_MAX,
+            'upstreams': {f"{scheme}://{host}:{port}": limiter.get_stats()
+                          for (scheme, host, port), limiter in limiters}
+        }
+
+
+rate_limiters = RateLimiterRegistry()
+
+
+def parse_retry_after(value):
+    """Retry-After in seconds (HTTP-date form is ignored)"""
     try:
-        with open(PROFILES_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, IOError):
-        return {"profiles": []}
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def status_class(status):
+    """'2xx', '4xx'... or 'error' for a network failure (status None)"""
+    return f'{status // 100}xx' if status else 'error'
+
+
+def metric_labels(**labels):
+    """Prometheus label set {a="1",b="x"} (backslashes, quotes and newlines escaped)"""
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def route_label(path):
+    """Low-cardinality route of a request path: IDs (DevEUI, UUID...) become {id}"""
+    path = path.split('?', 1)[0]
+    prefix = ''
+    if path.startswith('/proxy/'):
+        prefix, path = '/proxy', split_api_url(path[len('/proxy/'):])[1]
+    if not path.startswith('/api/') and path not in ('/metrics', '/health'):
+        return prefix or '/static'
+    segments = [s if re.match(r'^[a-z][a-z-]*$', s) and not re.match(r'^[0-9a-f-]{8,}$', s) else '{id}'
+                for s in path.strip('/').split('/')]
+    return prefix + '/' + '/'.join(segments)
+
+
+class ProxyMetrics:
+    """Counters, histograms and gauges of the proxy, rendered for /metrics (Prometheus text format).
+
+    Handler side: requests per route / method / status class, duration histogram,
+    bytes in / out and in-flight requests. Upstream side: calls per ChirpStack
+    server and status class, latency quantiles over the last METRICS_WINDOW calls.
+    """
+
+    def __init__(self, buckets=METRICS_BUCKETS, window=METRICS_WINDOW):
+        self.buckets = buckets
+        self.window = window
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = defaultdict(int)  # (route, method, status class) -> count
+        self.durations = {}  # route -> [bucket counts..., +Inf count, sum]
+        self.bytes_in = defaultdict(int)  # route -> bytes
+        self.bytes_out = defaultdict(int)
+        self.upstream_requests = defaultdict(int)  # (upstream, status class) -> count
+        self.upstream_latency = {}  # upstream -> (deque of recent latencies, count, sum)
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_cancelled(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def request_finished(self, route, method, status, duration, bytes_in, bytes_out):
+        with self._lock:
+            self.in_flight -= 1
+            self.requests[(route, method, status_class(status))] += 1
+            histogram = self.durations.setdefault(route, [0] * (len(self.buckets) + 2))
+            histogram[bisect.bisect_left(self.buckets, duration)] += 1
+            histogram[-1] += duration
+            self.bytes_in[route] += bytes_in
+            self.bytes_out[route] += bytes_out
+
+    def observe_upstream(self, upstream, status, latency):
+        with self._lock:
+            self.upstream_requests[(upstream, status_class(status))] += 1
+            recent, count, total = self.upstream_latency.get(upstream) or (deque(maxlen=self.window), 0, 0.0)
+            recent.append(latency)
+            self.upstream_latency[upstream] = (recent, count + 1, total + latency)
+
+    def render(self):
+        """Prometheus text exposition (version 0.0.4)"""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(f'{sample_name}{metric_labels(**labels) if labels else ""} {value}'
+                         for sample_name, labels, value in samples)
+
+        with self._lock:
+            metric('chirpstack_proxy_in_flight_requests', 'gauge', 'Requests being handled',
+                   [('chirpstack_proxy_in_flight_requests', {}, self.in_flight)])
+            metric('chirpstack_proxy_requests_total', 'counter', 'Requests handled by route, method and status class',
+                   [('chirpstack_proxy_requests_total', {'route': r, 'method': m, 'status': s}, n)
+                    for (r, m, s), n in sorted(self.requests.items())])
+            samples = []
+            for route, histogram in sorted(self.durations.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), histogram):
+                    cumulative += count
+                    samples.append(('chirpstack_proxy_request_duration_seconds_bucket',
+                                    {'route': route, 'le': bound}, cumulative))
+                samples.append(('chirpstack_proxy_request_duration_seconds_sum', {'route': route}, round(histogram[-1], 6)))
+                samples.append(('chirpstack_proxy_request_duration_seconds_count', {'route': route}, cumulative))
+            metric('chirpstack_proxy_request_duration_seconds', 'histogram', 'Time to handle a request', samples)
+            metric('chirpstack_proxy_request_bytes_total', 'counter', 'Request body bytes received',
+                   [('chirpstack_proxy_request_bytes_total', {'route': r}, n) for r, n in sorted(self.bytes_in.items())])
+            metric('chirpstack_proxy_response_bytes_total', 'counter', 'Response bytes sent',
+                   [('chirpstack_proxy_response_bytes_total', {'route': r}, n) for r, n in sorted(self.bytes_out.items())])
+            metric('chirpstack_upstream_requests_total', 'counter', 'ChirpStack calls by server and status class',
+                   [('chirpstack_upstream_requests_total', {'upstream': u, 'status': s}, n)
+                    for (u, s), n in sorted(self.upstream_requests.items())])
+            samples = []
+            for upstream, (recent, count, total) in sorted(self.upstream_latency.items()):
+                ordered = sorted(recent)
+                for q in (0.5, 0.95, 0.99):
+                    value = ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+                    samples.append(('chirpstack_upstream_latency_seconds', {'upstream': upstream, 'quantile': q}, round(value, 6)))
+                samples.append(('chirpstack_upstream_latency_seconds_sum', {'upstream': upstream}, round(total, 6)))
+                samples.append(('chirpstack_upstream_latency_seconds_count', {'upstream': upstream}, count))
+            metric('chirpstack_upstream_latency_seconds', 'summary',
+                   f'ChirpStack call latency (quantiles over the last {self.window} calls)', samples)
+
+        pool = upstream_pool.get_stats()
+        metric('chirpstack_upstream_connections_total', 'counter', 'Upstream connections created, reused or discarded',
+               [('chirpstack_upstream_connections_total', {'state': state}, pool[state])
+                for state in ('created', 'reused', 'discarded')])
+        metric('chirpstack_upstream_idle_connections', 'gauge', 'Idle keep-alive connections per server',
+               [('chirpstack_upstream_idle_connections', {'upstream': u}, n) for u, n in sorted(pool['idle'].items())])
+        metric('chirpstack_upstream_rate_limit', 'gauge', 'Current adaptive rate limit (requests/s) per server',
+               [('chirpstack_upstream_rate_limit', {'upstream': u}, s['rate'])
+                for u, s in sorted(rate_limiters.get_stats()['upstreams'].items())])
+        return '\n'.join(lines) + '\n'
+
+
+proxy_metrics = ProxyMetrics()
+
+
+class CountingWriter:
+    """Wraps a handler's wfile to count the bytes sent"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.count = 0
+
+    def write(self, data):
+        self.count += len(data)
+        return self.stream.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class ChunkedWriter:
+    """HTTP/1.1 chunked transfer coding over a handler's wfile.
+
+    finish() writes the terminating chunk: a body cut short (error, server stopped)
+    lacks it, so the client reports a failed download instead of a truncated file.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, data):
+        if data:
+            self.stream.write(b'%x\r\n' % len(data) + bytes(data) + b'\r\n')
+        return len(data)
+
+    def flush(self):
+        self.stream.flush()
+
+    def finish(self):
+        self.stream.write(b'0\r\n\r\n')
+        self.stream.flush()
+
+
+def accepted_encodings(header):
+    """Content codings of an Accept-Encoding header we can produce, best first ('br', 'gzip')"""
+    qualities = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip():
+            qualities[coding.strip().lower()] = quality
+    supported = ('br', 'gzip') if brotli is not None else ('gzip',)
+    return [coding for coding in supported if qualities.get(coding, qualities.get('*', 0)) > 0]
+
+
+def is_compressible(content_type):
+    return (content_type or '').split(';')[0].strip().lower().startswith(COMPRESS_TYPES)
+
+
+def compress(body, encoding, static=False):
+    """body compressed with 'br' or 'gzip': strongest level for static files (compressed once), faster one otherwise"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=11 if static else 5)
+    return gzip.compress(body, compresslevel=9 if static else 6, mtime=0)
+
+
+def stream_compressor(encoding):
+    """Incremental 'br' / 'gzip' compressor -> (compress(chunk), finish()) callables.
+
+    Each chunk is flushed so the client gets bytes as soon as they arrive from
+    ChirpStack, at the cost of a few bytes per chunk.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        return (lambda chunk: compressor.process(chunk) + compressor.flush()), compressor.finish
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    return (lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)), compressor.flush
 
 
-def save_profiles(data):
-    """Save profiles to JSON file"""
-    ensure_data_dir()
-    with open(PROFILES_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+class StaticFiles:
+    """Static files (main.html...) kept in memory along with their gzip / brotli versions.
+
+    An entry is rebuilt when the file's size or mtime changes, so editing main.html
+    needs no restart. The strong ETag is a hash of the content, suffixed by the
+    encoding since each compressed representation is a different byte sequence.
+    """
+
+    def __init__(self, max_size=STATIC_CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self._entries = {}  # path -> {'stamp', 'etag', 'bodies': {encoding: bytes}}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """Entry of a regular file, or None (missing, directory, larger than max_size)"""
+        try:
+            if not os.path.isfile(path):
+                return None
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_size > self.max_size:
+            return None
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is not None and entry['stamp'] == stamp:
+            return entry
+
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+        bodies = {'identity': body}
+        if COMPRESS_MIN_SIZE and len(body) >= COMPRESS_MIN_SIZE:
+            for encoding in accepted_encodings('*'):
+                bodies[encoding] = compress(body, encoding, static=True)
+        entry = {'stamp': stamp, 'etag': hashlib.sha256(body).hexdigest()[:32], 'bodies': bodies}
+        with self._lock:
+            self._entries[path] = entry
+        return entry
+
+
+static_files = StaticFiles()
+
+
+class UpstreamResponse:
+    """Fully read response returned by UpstreamPool.request()"""
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.encoded = {}  # Content coding -> compressed body, filled by ProxyHandler.write_body()
+
+
+class UpstreamStream:
+    """Upstream response whose body is read on demand, returned by UpstreamPool.open().
+
+    The connection goes back to the pool once the body has been read to the end;
+    closing the stream before that drops the connection (unread bytes are left on it).
+    """
+
+    def __init__(self, pool, key, conn, response):
+        self.status = response.status
+        self.headers = response.headers
+        self.length = response.length  # None if chunked or delimited by the connection close
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._response = response
+
+    def read(self):
+        return self._response.read()
+
+    def chunks(self, size=PROXY_CHUNK_SIZE):
+        """Yield the body as it arrives, at most `size` bytes at a time"""
+        while True:
+            chunk = self._response.read1(size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        if self._response.length == 0:
+            self._response.read()  # No body (HEAD, 204, 304): nothing left on the connection
+        if self._response.isclosed() and not self._response.will_close:
+            self._pool._release(self._key, conn)
+        else:
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BoundedReader:
+    """File-like view of the next `length` bytes of a stream (request body sent upstream as it is read)"""
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.stream.read(size)
+        if not data:
+            raise ConnectionError('Request body truncated by the client')
+        self.remaining -= len(data)
+        return data
+
+
+class UpstreamPool:
+    """Thread-safe pool of persistent HTTP/1.1 connections, one idle list per upstream host.
+
+    Connections are reused across proxied requests so bulk operations only pay
+    the TCP/TLS handshake once per worker instead of once per call.
+    """
+
+    def __init__(self, max_size=POOL_MAX_SIZE, idle_timeout=POOL_IDLE_TIMEOUT):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._idle = {}  # (scheme, host, port) -> [(connection, last_used)]
+        self._lock = threading.Lock()
+        self._ssl_context = ssl.create_default_context()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def _new_connection(self, key, timeout):
+        scheme, host, port = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=timeout, context=self._ssl_context)
+        return http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _acquire(self, key, timeout):
+        """Return (connection, reused) - the most recently used idle connection if any"""
+        now = time.monotonic()
+        expired = []
+        conn = None
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                candidate, last_used = idle.pop()
+                if now - last_used <= self.idle_timeout:
+                    conn = candidate
+                    break
+                expired.append(candidate)
+            # Older entries are even staler than the expired one
+            if expired:
+                expired.extend(c for c, _ in idle)
+                idle.clear()
+            self.discarded += len(expired)
+            if conn is not None:
+                self.reused += 1
+            else:
+                self.created += 1
+        for c in expired:
+            c.close()
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+        return self._new_connection(key, timeout), False
+
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_size:
+                idle.append((conn, time.monotonic()))
+                return
+            self.discarded += 1
+        conn.close()
+
+    def request(self, method, url, body=None, headers=None, timeout=UPSTREAM_TIMEOUT):
+        """Send a request and read the whole response. Raises OSError/HTTPException on failure."""
+        with self.open(method, url, body, headers, timeout) as stream:
+            return UpstreamResponse(stream.status, stream.headers, stream.read())
+
+    def open(self, method, url, body=None, headers=None, timeout=UPSTREAM_TIMEOUT):
+        """Send a request and return an UpstreamStream as soon as the response headers are in.
+
+        body is bytes or a file-like object; a file-like body is streamed (set its
+        Content-Length header) and not replayed if a reused connection turns out closed.
+        Raises OSError/HTTPException on failure.
+        """
+        parsed = urlparse(url)
+        scheme = parsed.scheme.lower()
+        port = parsed.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parsed.hostname, port)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+
+        limiter = rate_limiters.get(key)
+        if limiter is not None:
+            limiter.acquire()
+        started = time.monotonic()
+        upstream = f'{scheme}://{parsed.hostname}:{port}'
+        try:
+            response = self._open(key, method, path, body, headers, timeout)
+        except TimeoutError:
+            proxy_metrics.observe_upstream(upstream, None, time.monotonic() - started)
+            if limiter is not None:
+                limiter.record(time.monotonic() - started, overloaded=True)
+            raise
+        except (OSError, http.client.HTTPException):
+            proxy_metrics.observe_upstream(upstream, None, time.monotonic() - started)
+            raise
+        proxy_metrics.observe_upstream(upstream, response.status, time.monotonic() - started)
+        if limiter is not None:
+            overloaded = response.status in RATE_LIMIT_OVERLOAD_STATUSES
+            limiter.record(time.monotonic() - started, overloaded,
+                           parse_retry_after(response.headers.get('Retry-After')) if overloaded else None)
+        return response
+
+    def _open(self, key, method, path, body, headers, timeout):
+        for attempt in range(2):
+            conn, reused = self._acquire(key, timeout)
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if reused and attempt == 0 and not hasattr(body, 'read'):
+                    continue  # Keep-alive connection closed by the server meanwhile: retry on a fresh one
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            return UpstreamStream(self, key, conn, response)
+
+    def get_stats(self):
+        """Counters of new vs reused connections and idle connections per host"""
+        with self._lock:
+            idle = {f"{scheme}://{host}:{port}": len(conns)
+                    for (scheme, host, port), conns in self._idle.items() if conns}
+            return {
+                'created': self.created,
+                'reused': self.reused,
+                'discarded': self.discarded,
+                'idle': idle,
+                'maxSize': self.max_size,
+                'idleTimeout': self.idle_timeout
+            }
+
+
+upstream_pool = UpstreamPool()
+
+
+# gRPC status code -> HTTP status, as the REST gateway maps them
+GRPC_HTTP_STATUSES = {
+    'INVALID_ARGUMENT': 400, 'FAILED_PRECONDITION': 400, 'OUT_OF_RANGE': 400,
+    'UNAUTHENTICATED': 401, 'PERMISSION_DENIED': 403, 'NOT_FOUND': 404,
+    'ALREADY_EXISTS': 409, 'ABORTED': 409, 'RESOURCE_EXHAUSTED': 429, 'CANCELLED': 499,
+    'UNIMPLEMENTED': 501, 'UNAVAILABLE': 503, 'DEADLINE_EXCEEDED': 504,
+}
+
+
+class GrpcBackend:
+    """Device calls sent to ChirpStack's native gRPC API instead of the REST gateway.
+
+    Only the device and device-keys routes are translated (same JSON in and out as
+    the REST API); everything else keeps going through UpstreamPool. One channel
+    per gRPC target is shared by all threads: calls are multiplexed over a single
+    HTTP/2 connection and carry protobuf instead of JSON.
+    """
+
+    # (method, path pattern) -> (DeviceService RPC, request message)
+    ROUTES = [
+        ('GET', re.compile(r'^/api/devices$'), 'List', 'ListDevicesRequest'),
+        ('POST', re.compile(r'^/api/devices$'), 'Create', 'CreateDeviceRequest'),
+        ('GET', re.compile(r'^/api/devices/([0-9A-Fa-f]{16})$'), 'Get', 'GetDeviceRequest'),
+        ('PUT', re.compile(r'^/api/devices/([0-9A-Fa-f]{16})$'), 'Update', 'UpdateDeviceRequest'),
+        ('DELETE', re.compile(r'^/api/devices/([0-9A-Fa-f]{16})$'), 'Delete', 'DeleteDeviceRequest'),
+        ('GET', re.compile(r'^/api/devices/([0-9A-Fa-f]{16})/keys$'), 'GetKeys', 'GetDeviceKeysRequest'),
+        ('POST', re.compile(r'^/api/devices/([0-9A-Fa-f]{16})/keys$'), 'CreateKeys', 'CreateDeviceKeysRequest'),
+        ('PUT', re.compile(r'^/api/devices/([0-9A-Fa-f]{16})/keys$'), 'UpdateKeys', 'UpdateDeviceKeysRequest'),
+        ('DELETE', re.compile(r'^/api/devices/([0-9A-Fa-f]{16})/keys$'), 'DeleteKeys', 'DeleteDeviceKeysRequest'),
+    ]
+
+    def __init__(self, target=GRPC_TARGET, default_port=GRPC_PORT):
+        self.target = target.strip()
+        self.default_port = default_port
+        self._stubs = {}  # gRPC target -> DeviceServiceStub
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    @property
+    def enabled(self):
+        return bool(self.target) and grpc is not None
+
+    def _stub(self, base_url):
+        parsed = urlparse(base_url)
+        if self.target == 'auto':
+            secure = parsed.scheme == 'https'
+            target = f'{parsed.hostname}:{self.default_port}'
+        else:
+            secure = self.target.startswith('grpcs://')
+            target = self.target.split('://', 1)[-1]
+        with self._lock:
+            stub = self._stubs.get(target)
+            if stub is None:
+                channel = (grpc.secure_channel(target, grpc.ssl_channel_credentials()) if secure
+                           else grpc.insecure_channel(target))
+                stub = self._stubs[target] = chirpstack_api.DeviceServiceStub(channel)
+            return stub
+
+    @staticmethod
+    def _to_dict(message):
+        try:
+            return json_format.MessageToDict(message, always_print_fields_with_no_presence=True)
+        except TypeError:  # protobuf < 5.26
+            return json_format.MessageToDict(message, including_default_value_fields=True)
+
+    def request(self, method, url, body, auth_header, timeout=UPSTREAM_TIMEOUT):
+        """Send a REST-style device call over gRPC -> UpstreamResponse, or None if not handled"""
+        if not self.enabled:
+            return None
+        base_url, path = split_api_url(url)
+        for route_method, pattern, rpc, request_name in self.ROUTES:
+            match = pattern.match(path) if route_method == method else None
+            if match:
+                break
+        else:
+            return None
+
+        if isinstance(body, (bytes, bytearray)):
+            body = json.loads(body.decode('utf-8')) if body else {}
+        fields = dict(body or {})
+        if method == 'GET' and not match.groups():
+            # List filters come from the query string (applicationId, limit, offset, search...)
+            fields.update({k: v[0] for k, v in parse_qs(urlparse(url).query).items()})
+        if match.groups():
+            dev_eui = match.group(1)
+            if request_name == 'UpdateDeviceRequest':
+                fields['device'] = {**(fields.get('device') or {}), 'devEui': dev_eui}
+            elif request_name in ('CreateDeviceKeysRequest', 'UpdateDeviceKeysRequest'):
+                keys = fields.pop('deviceKeys', None) or fields.pop('device_keys', None) or {}
+                fields['deviceKeys'] = {**keys, 'devEui': dev_eui}
+            else:
+                fields['devEui'] = dev_eui
+
+        try:
+            message = json_format.ParseDict(fields, getattr(chirpstack_api, request_name)(),
+                                            ignore_unknown_fields=True)
+        except json_format.ParseError as e:
+            return UpstreamResponse(400, {'Content-Type': 'application/json'},
+                                    json.dumps({'code': 3, 'message': str(e), 'details': []}).encode('utf-8'))
+
+        parsed = urlparse(url)
+        limiter = rate_limiters.get((parsed.scheme.lower(), parsed.hostname,
+                                     parsed.port or (443 if parsed.scheme.lower() == 'https' else 80)))
+        if limiter is not None:
+            limiter.acquire()
+        metadata = [('authorization', auth_header)] if auth_header else []
+        started = time.monotonic()
+        try:
+            reply = getattr(self._stub(base_url), rpc)(message, metadata=metadata, timeout=timeout)
+            status, data = 200, self._to_dict(reply)
+        except grpc.RpcError as e:
+            code = e.code()
+            status = GRPC_HTTP_STATUSES.get(code.name, 500)
+            data = {'code': code.value[0], 'message': e.details() or code.name, 'details': []}
+        proxy_metrics.observe_upstream(f'grpc://{self.target}', status, time.monotonic() - started)
+        if limiter is not None:
+            limiter.record(time.monotonic() - started, status in RATE_LIMIT_OVERLOAD_STATUSES)
+        with self._lock:
+            self.calls += 1
+        return UpstreamResponse(status, {'Content-Type': 'application/json'}, json.dumps(data).encode('utf-8'))
+
+    def get_stats(self):
+        with self._lock:
+            return {'enabled': self.enabled, 'target': self.target, 'calls': self.calls}
+
+
+grpc_backend = GrpcBackend()
+
+
+class ChirpStackError(Exception):
+    """Error response (or network failure) from the ChirpStack API"""
+
+    def __init__(self, status, message):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class ChirpStackClient:
+    """Minimal JSON client for the ChirpStack REST API, used by server-side operations"""
+
+    def __init__(self, base_url, auth_header):
+        self.base_url = base_url.rstrip('/')
+        self.auth_header = auth_header
+
+    def call(self, method, path, body=None):
+        """Call the API and return the decoded JSON response. Raises ChirpStackError."""
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Accept': 'application/json'}
+        if self.auth_header:
+            headers['Grpc-Metadata-Authorization'] = self.auth_header
+        if data is not None:
+            headers['Content-Type'] = 'application/json'
+
+        # A 504 can come after ChirpStack committed the write: replaying a POST would then
+        # fail with "already exists", so POSTs only retry refusals (429, 503)
+        retry_statuses = OVERLOAD_RETRY_POST_STATUSES if method == 'POST' else RATE_LIMIT_OVERLOAD_STATUSES
+        for _ in range(OVERLOAD_RETRIES + 1):
+            try:
+                response = grpc_backend.request(method, self.base_url + path, body, self.auth_header)
+                if response is None:
+                    response = upstream_pool.request(method, self.base_url + path, body=data, headers=headers)
+            except (OSError, http.client.HTTPException) as e:
+                raise ChirpStackError(502, json.dumps({'error': str(e)}))
+            # The rate limiter has already backed off: just try again
+            if response.status not in retry_statuses:
+                break
+
+        if response.status >= 400:
+            raise ChirpStackError(response.status, response.body.decode('utf-8', 'replace'))
+        if method != 'GET':
+            device_inventories.observe(method, self.base_url + path, body)
+            proxy_cache.observe(self.base_url + path)
+        return json.loads(response.body) if response.body else {}
+
+    def list_all(self, path, page_size=100):
+        """Page through a list endpoint (path with its filters, e.g. '/api/gateways?tenantId=...')"""
+        items = []
+        separator = '&' if '?' in path else '?'
+        while True:
+            data = self.call('GET', f"{path}{separator}limit={page_size}&offset={len(items)}")
+            page = data.get('result') or []
+            items.extend(page)
+            if not page or len(items) >= int(data.get('totalCount') or 0):
+                return items
+
+
+def bounded_map(func, items, concurrency):
+    """Apply func to every item with at most `concurrency` calls in flight, results in input order"""
+    items = list(items)
+    if not items:
+        return []
+    workers = max(1, min(concurrency, len(items)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bulk') as executor:
+        return list(executor.map(func, items))
+
+
+def clamp_concurrency(value, default=IMPORT_CONCURRENCY):
+    """Parse a client-supplied concurrency, bounded to [1, IMPORT_MAX_CONCURRENCY]"""
+    try:
+        value = int(value) if value is not None else default
+    except (TypeError, ValueError):
+        value = default
+    return max(1, min(value, IMPORT_MAX_CONCURRENCY))
+
+
+def split_api_url(url):
+    """Split a ChirpStack URL into (base URL, '/api/...' path without query)"""
+    url = url.split('?', 1)[0]
+    index = url.find('/api/')
+    if index < 0:
+        return url.rstrip('/'), ''
+    return url[:index].rstrip('/'), url[index:]
+
+
+def token_hash(auth_header):
+    """Short digest of an auth header: inventories are per token, the token itself is not kept"""
+    return hashlib.sha256((auth_header or '').encode('utf-8')).hexdigest()[:16]
+
+
+def normalized_keys(keys):
+    """{'nwkKey', 'appKey'} of a device-keys object (camelCase or snake_case), lowercase, empty keys left out"""
+    keys = keys if isinstance(keys, dict) else {}
+    result = {}
+    for field, alias in (('nwkKey', 'nwk_key'), ('appKey', 'app_key')):
+        value = keys.get(field) or keys.get(alias)
+        if value:
+            result[field] = str(value).lower()
+    return result
+
+
+def key_digest(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()[:16]
+
+
+class DeviceInventory:
+    """Cached device list of one application, indexed by lowercase DevEUI (upstream order kept)"""
+
+    def __init__(self, base_url, application_id):
+        self.base_url = base_url
+        self.application_id = application_id
+        self.devices = {}
+        self.loaded_at = None
+        self.expires = 0.0
+        self.generation = 0  # Bumped by invalidations, detects writes during a load
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()  # One upstream listing at a time
+
+    def is_fresh(self):
+        with self.lock:
+            return self.loaded_at is not None and time.monotonic() < self.expires
+
+    def _fetch_page(self, client, offset, limit):
+        return client.call('GET', f"/api/devices?applicationId={quote(self.application_id)}"
+                                  f"&limit={limit}&offset={offset}")
+
+    def load(self, client, ttl):
+        """List every device of the application from ChirpStack.
+
+        The first page gives totalCount; the remaining offsets are then fetched with
+        at most INVENTORY_PREFETCH requests in flight and consumed in order.
+        """
+        with self.lock:
+            generation = self.generation
+        devices = {}
+
+        def add_page(data):
+            # Devices moved between pages while listing are deduplicated by DevEUI
+            for device in data.get('result') or []:
+                devices[device['devEui'].lower()] = device
+
+        first = self._fetch_page(client, 0, INVENTORY_PAGE_SIZE)
+        add_page(first)
+        total = int(first.get('totalCount') or 0)
+        # ChirpStack may cap the page size below what was asked: step by what it returned
+        step = len(first.get('result') or [])
+        if step and total > step:
+            prefetch = max(1, INVENTORY_PREFETCH)
+            with ThreadPoolExecutor(max_workers=prefetch, thread_name_prefix='inventory') as executor:
+                window = deque()
+                for offset in range(step, total, step):
+                    window.append(executor.submit(self._fetch_page, client, offset, step))
+                    if len(window) >= prefetch:
+                        add_page(window.popleft().result())
+                while window:
+                    add_page(window.popleft().result())
+
+        with self.lock:
+            self.devices = devices
+            self.loaded_at = datetime.utcnow().isoformat() + 'Z'
+            # A write seen while listing may be missing from the pages: reload next time
+            self.expires = time.monotonic() + ttl if generation == self.generation else 0.0
+
+    def invalidate(self):
+        with self.lock:
+            self.expires = 0.0
+            self.generation += 1
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.devices.values())
+
+    def get_device(self, dev_eui):
+        """Copy of the cached list item for a DevEUI, or None"""
+        with self.lock:
+            device = self.devices.get(dev_eui.lower())
+            return dict(device) if device is not None else None
+
+    def apply_update(self, dev_eui, device):
+        """Patch a cached device after a successful PUT. Returns False if it left this application."""
+        with self.lock:
+            cached = self.devices.get(dev_eui)
+            if cached is None:
+                return True
+            application_id = device.get('applicationId') or device.get('application_id')
+            if application_id and application_id != self.application_id:
+                del self.devices[dev_eui]
+                return False
+            for field, alias in (('name', None), ('description', None), ('tags', None),
+                                 ('deviceProfileId', 'device_profile_id')):
+                value = device.get(field, device.get(alias) if alias else None)
+                if value is None or value == cached.get(field):
+                    continue
+                cached[field] = value
+                if field == 'deviceProfileId':
+                    # The list item also carries the profile name: borrow it from a sibling
+                    names = [d.get('deviceProfileName') for d in self.devices.values()
+                             if d.get('deviceProfileId') == value and d is not cached]
+                    if names:
+                        cached['deviceProfileName'] = names[0]
+                    else:
+                        self.expires = 0.0
+            self.generation += 1
+            return True
+
+    def apply_delete(self, dev_eui):
+        with self.lock:
+            if self.devices.pop(dev_eui, None) is not None:
+                self.generation += 1
+
+
+class DeviceInventoryStore:
+    """Device inventories per (server URL, application, token), kept coherent with observed writes.
+
+    Listing a large application is the most expensive thing the UI does; every tool
+    (duplicate check, analysis, export, bulk delete...) shares the same cached list
+    instead of paging through /api/devices again.
+    """
+
+    def __init__(self, ttl=INVENTORY_TTL):
+        self.ttl = ttl
+        self._inventories = {}  # (base_url, application_id, token hash) -> DeviceInventory
+        self._key_digests = {}  # (base_url, devEui) -> ({key field: digest}, expires) of keys seen
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, client, application_id, refresh=False):
+        """Return (inventory, cached) - loading it from ChirpStack if missing or stale"""
+        key = (client.base_url, application_id, token_hash(client.auth_header))
+        with self._lock:
+            inventory = self._inventories.get(key)
+            if inventory is None:
+                inventory = self._inventories[key] = DeviceInventory(client.base_url, application_id)
+        with inventory.load_lock:
+            cached = not refresh and inventory.is_fresh()
+            if not cached:
+                inventory.load(client, self.ttl)
+        with self._lock:
+            if cached:
+                self.hits += 1
+            else:
+                self.loads += 1
+        return inventory, cached
+
+    def _matching(self, base_url, application_id=None):
+        with self._lock:
+            return [inv for (base, app, _), inv in self._inventories.items()
+                    if base == base_url and (application_id is None or app == application_id)]
+
+    def invalidate(self, base_url, application_id=None):
+        """Mark the inventories of a server (or of one application) as stale"""
+        inventories = self._matching(base_url, application_id)
+        for inventory in inventories:
+            inventory.invalidate()
+        return len(inventories)
+
+    def record_keys(self, base_url, dev_eui, keys):
+        """Remember digests of the keys a device has in ChirpStack (device-keys object, {} if none)"""
+        digests = {field: key_digest(value) for field, value in normalized_keys(keys).items()}
+        with self._lock:
+            self._key_digests[(base_url, dev_eui.lower())] = (digests, time.monotonic() + self.ttl)
+
+    def known_keys(self, base_url, dev_eui):
+        """Key digests recorded less than `ttl` seconds ago, or None if unknown"""
+        key = (base_url, dev_eui.lower())
+        with self._lock:
+            entry = self._key_digests.get(key)
+            if entry is not None and time.monotonic() >= entry[1]:
+                del self._key_digests[key]  # May have been changed outside this server since
+                entry = None
+        return entry[0] if entry is not None else None
+
+    def forget_keys(self, base_url, dev_eui):
+        with self._lock:
+            self._key_digests.pop((base_url, dev_eui.lower()), None)
+
+    def observe(self, method, url, body):
+        """Apply a successful ChirpStack write (proxied or server-side) to the cached inventories"""
+        base_url, path = split_api_url(url)
+        if path == '/api/devices' and method == 'POST':
+            device = self._device_from_body(body)
+            self.invalidate(base_url, device.get('applicationId') or device.get('application_id'))
+            dev_eui = device.get('devEui') or device.get('dev_eui')
+            if dev_eui:
+                self.record_keys(base_url, dev_eui, {})  # A new device has no keys yet
+            return
+        match = re.match(r'^/api/devices/([0-9A-Fa-f]{16})(/keys)?$', path)
+        if not match:
+            return
+        dev_eui = match.group(1).lower()
+        if match.group(2):
+            keys = self._body_json(body)
+            keys = keys.get('deviceKeys') or keys.get('device_keys')
+            if method == 'DELETE':
+                self.record_keys(base_url, dev_eui, {})
+            elif method in ('POST', 'PUT') and isinstance(keys, dict):
+                self.record_keys(base_url, dev_eui, keys)
+            else:
+                self.forget_keys(base_url, dev_eui)
+            return
+        if method not in ('PUT', 'DELETE'):
+            return
+        if method == 'DELETE':
+            self.forget_keys(base_url, dev_eui)
+        for inventory in self._matching(base_url):
+            if method == 'DELETE':
+                inventory.apply_delete(dev_eui)
+            else:
+                device = self._device_from_body(body)
+                if not inventory.apply_update(dev_eui, device):
+                    self.invalidate(base_url, device.get('applicationId') or device.get('application_id'))
+
+    @staticmethod
+    def _body_json(body):
+        if isinstance(body, (bytes, bytearray)):
+            try:
+                body = json.loads(body.decode('utf-8'))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                return {}
+        return body if isinstance(body, dict) else {}
+
+    @classmethod
+    def _device_from_body(cls, body):
+        device = cls._body_json(body).get('device')
+        return device if isinstance(device, dict) else {}
+
+    def get_stats(self):
+        with self._lock:
+            inventories = list(self._inventories.values())
+            hits, loads = self.hits, self.loads
+        return {
+            'inventories': len(inventories),
+            'devices': sum(len(inv.devices) for inv in inventories),
+            'hits': hits,
+            'loads': loads,
+            'ttl': self.ttl
+        }
+
+
+device_inventories = DeviceInventoryStore()
+
+
+class ProxyCache:
+    """LRU cache of proxied GET responses for read-mostly metadata (PROXY_CACHE_PATH).
+
+    Tenants, applications and device profiles are listed again by every screen and
+    tool. Entries are per (server URL, path + query, token hash), fresh for `ttl`
+    seconds, then revalidated with If-None-Match when ChirpStack sent an ETag.
+    A successful write to a resource family drops its cached entries.
+    """
+
+    def __init__(self, ttl=PROXY_CACHE_TTL, max_entries=PROXY_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (response, expires)
+        self._lock = threading.Lock()
+        self._generation = 0  # Bumped by invalidations: a response read meanwhile is not stored
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    def _key(self, url, auth_header):
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return None
+        base_url, path = split_api_url(url)
+        if not PROXY_CACHE_PATH.match(path):
+            return None
+        query = url.split('?', 1)[1] if '?' in url else ''
+        return (base_url, path, query, token_hash(auth_header))
+
+    def cacheable(self, url):
+        return self._key(url, '') is not None
+
+    def fetch(self, url, headers):
+        """GET through the cache -> (UpstreamResponse, Cache-Status value or None if not cacheable)"""
+        key = self._key(url, headers.get('Grpc-Metadata-Authorization', ''))
+        if key is None:
+            return upstream_pool.request('GET', url, headers=headers), None
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if now < entry[1]:
+                    self.hits += 1
+                    return entry[0], f'chirpstack-proxy; hit; ttl={int(entry[1] - now)}'
+            generation = self._generation
+
+        request_headers = dict(headers)
+        etag = entry[0].headers.get('ETag') if entry is not None else None
+        if etag:
+            request_headers['If-None-Match'] = etag
+        response = upstream_pool.request('GET', url, headers=request_headers)
+
+        if response.status == 304 and entry is not None:
+            self._store(key, entry[0], generation)
+            with self._lock:
+                self.revalidated += 1
+            return entry[0], 'chirpstack-proxy; fwd=stale; fwd-status=304'
+        with self._lock:
+            self.misses += 1
+        status = f"chirpstack-proxy; fwd={'stale' if entry is not None else 'miss'}; fwd-status={response.status}"
+        if response.status == 200 and self._store(key, response, generation):
+            status += '; stored'
+        return response, status
+
+    def _store(self, key, response, generation):
+        with self._lock:
+            if generation != self._generation:
+                return False  # Written meanwhile: the response may be outdated
+            self._entries[key] = (response, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def observe(self, url):
+        """Drop cached entries made stale by a successful write (POST/PUT/DELETE) to `url`"""
+        base_url, path = split_api_url(url)
+        match = re.match(r'^/api/([a-z-]+)', path)
+        if not match:
+            return
+        family = f'/api/{match.group(1)}'
+        with self._lock:
+            self._generation += 1
+            for key in [k for k in self._entries if k[0] == base_url and
+                        (family == '/api/tenants' or k[1].startswith(family))]:
+                del self._entries[key]  # Deleting a tenant also removes its applications and profiles
+
+    def get_stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits,
+                    'misses': self.misses, 'revalidated': self.revalidated}
+
+
+proxy_cache = ProxyCache()
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchSegment:
+    """Search structures for the devices of one application.
+
+    Sorted (key, position) arrays answer prefix queries with bisect; a trigram
+    index narrows substring queries to a few candidates before the final check.
+    """
+
+    def __init__(self, application, devices, version):
+        self.version = version
+        self.entries = [{
+            'devEui': d.get('devEui', ''),
+            'name': d.get('name', ''),
+            'applicationId': application['id'],
+            'applicationName': application.get('name', ''),
+            'deviceProfileName': d.get('deviceProfileName', ''),
+            'lastSeenAt': d.get('lastSeenAt')
+        } for d in devices]
+        self.keys = [(e['devEui'].lower(), e['name'].lower()) for e in self.entries]
+        self.by_eui = sorted((eui, i) for i, (eui, _) in enumerate(self.keys))
+        self.by_name = sorted((name, i) for i, (_, name) in enumerate(self.keys))
+        self.trigrams = defaultdict(set)
+        for i, (eui, name) in enumerate(self.keys):
+            for gram in trigrams(eui) | trigrams(name):
+                self.trigrams[gram].add(i)
+
+    @staticmethod
+    def _prefixed(sorted_keys, prefix):
+        for position in range(bisect.bisect_left(sorted_keys, (prefix,)), len(sorted_keys)):
+            key, i = sorted_keys[position]
+            if not key.startswith(prefix):
+                break
+            yield i
+
+    def prefix_matches(self, text, limit):
+        """Entries whose DevEUI or name starts with text (lowercase), DevEUI matches first"""
+        positions = dict.fromkeys(itertools.islice(self._prefixed(self.by_eui, text), limit))
+        positions.update(dict.fromkeys(itertools.islice(self._prefixed(self.by_name, text), limit)))
+        return [self.entries[i] for i in positions]
+
+    def substring_matches(self, text, limit):
+        """Entries whose DevEUI or name contains text (3 characters or more) without starting with it"""
+        if len(text) < 3 or limit <= 0:
+            return []
+        results = []
+        postings = sorted((self.trigrams.get(gram, set()) for gram in trigrams(text)), key=len)
+        for i in sorted(set.intersection(*postings)):
+            eui, name = self.keys[i]
+            if (text in eui or text in name) and not eui.startswith(text) and not name.startswith(text):
+                results.append(self.entries[i])
+                if len(results) >= limit:
+                    break
+        return results
+
+
+class TenantSearchIndex:
+    """DevEUI/name index over every application of a tenant, built one application at a time"""
+
+    def __init__(self, tenant_id):
+        self.tenant_id = tenant_id
+        self.segments = {}  # application id -> SearchSegment
+        self.applications = None  # Total known after the first listing
+        self.refreshed_at = 0.0
+        self.building = False
+        self.error = None
+        self.lock = threading.Lock()
+
+    def claim_refresh(self):
+        """True (and mark the index as building) when a refresh is due and none is running"""
+        with self.lock:
+            if self.building or time.monotonic() - self.refreshed_at < SEARCH_REFRESH_INTERVAL:
+                return False
+            self.building = True
+            return True
+
+    def refresh(self, client):
+        """(Re)build segments whose device inventory changed. Runs in a background thread."""
+        try:
+            applications = client.list_all(f"/api/applications?tenantId={quote(self.tenant_id)}")
+            with self.lock:
+                self.applications = len(applications)
+                known = {app['id'] for app in applications}
+                for application_id in list(self.segments):
+                    if application_id not in known:
+                        del self.segments[application_id]
+
+            for application in applications:
+                try:
+                    inventory, _ = device_inventories.get(client, application['id'])
+                except ChirpStackError:
+                    continue  # Application not readable with this token
+                with inventory.lock:
+                    version = (inventory.loaded_at, inventory.generation)
+                    devices = list(inventory.devices.values())
+                segment = self.segments.get(application['id'])
+                if segment is None or segment.version != version:
+                    segment = SearchSegment(application, devices, version)
+                    with self.lock:
+                        self.segments[application['id']] = segment
+            self.error = None
+        except ChirpStackError as e:
+            self.error = str(e)
+        finally:
+            with self.lock:
+                self.building = False
+                self.refreshed_at = time.monotonic()
+
+    def search(self, text, limit):
+        with self.lock:
+            segments = list(self.segments.values())
+        text = text.lower()
+        # Prefix matches of every application are ranked before truncating: an exact
+        # DevEUI in the last application must not lose its place to earlier name matches
+        results = [entry for segment in segments for entry in segment.prefix_matches(text, limit)]
+        results.sort(key=lambda e: (e['devEui'].lower() != text, not e['devEui'].lower().startswith(text)))
+        del results[limit:]
+        for segment in segments:
+            if len(results) >= limit:
+                break
+            results.extend(segment.substring_matches(text, limit - len(results)))
+        return results
+
+    def get_status(self):
+        with self.lock:
+            return {
+                'indexing': self.building,
+                'indexedApplications': len(self.segments),
+                'applications': self.applications,
+                'indexedDevices': sum(len(s.entries) for s in self.segments.values()),
+                'error': self.error
+            }
+
+
+class SearchIndexStore:
+    """Tenant search indexes per (server URL, tenant, token), refreshed in the background"""
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, client, tenant_id):
+        """Return the tenant index at once, starting a background refresh when it is due"""
+        key = (client.base_url, tenant_id, token_hash(client.auth_header))
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                index = self._indexes[key] = TenantSearchIndex(tenant_id)
+        if index.claim_refresh():
+            threading.Thread(target=index.refresh, args=(client,), name='search-index', daemon=True).start()
+        return index
+
+
+search_indexes = SearchIndexStore()
+
+
+class TenantDashboardStore:
+    """Device and gateway counters per tenant, cached for DASHBOARD_TTL seconds"""
+
+    def __init__(self, ttl=DASHBOARD_TTL):
+        self.ttl = ttl
+        self._entries = {}  # (base_url, tenant_id, token hash) -> (expires, data)
+        self._locks = defaultdict(threading.Lock)  # One computation per tenant at a time
+        self._lock = threading.Lock()
+
+    def get(self, client, tenant_id, refresh=False):
+        """Return (data, cached)"""
+        key = (client.base_url, tenant_id, token_hash(client.auth_header))
+        with self._lock:
+            compute_lock = self._locks[key]
+        with compute_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry and not refresh and time.monotonic() < entry[0]:
+                return entry[1], True
+            data = self._compute(client, tenant_id)
+            with self._lock:
+                self._entries[key] = (time.monotonic() + self.ttl, data)
+            return data, False
+
+    def _compute(self, client, tenant_id):
+        """List every application (and its devices) and every gateway, concurrently"""
+        with ThreadPoolExecutor(max_workers=DASHBOARD_CONCURRENCY, thread_name_prefix='dashboard') as executor:
+            gateways_future = executor.submit(client.list_all, f"/api/gateways?tenantId={quote(tenant_id)}")
+            applications = client.list_all(f"/api/applications?tenantId={quote(tenant_id)}")
+
+            def load(application):
+                try:
+                    return device_inventories.get(client, application['id'])[0].snapshot()
+                except ChirpStackError as e:
+                    return e
+
+            device_lists = list(executor.map(load, applications))
+            gateways = gateways_future.result()
+
+        counts = {'total': 0, 'active': 0, 'inactive': 0, 'neverSeen': 0}
+        errors = []
+        threshold = time.time() - DASHBOARD_ACTIVE_HOURS * 3600
+        for application, devices in zip(applications, device_lists):
+            if isinstance(devices, ChirpStackError):
+                errors.append({'applicationId': application['id'], 'error': str(devices)})
+                continue
+            for device in devices:
+                counts['total'] += 1
+                last_seen = parse_timestamp(device.get('lastSeenAt'))
+                if last_seen is None:
+                    counts['neverSeen'] += 1
+                elif last_seen >= threshold:
+                    counts['active'] += 1
+                else:
+                    counts['inactive'] += 1
+
+        return {
+            'tenantId': tenant_id,
+            'applications': len(applications),
+            'devices': counts,
+            'gateways': {
+                'total': len(gateways),
+                # ChirpStack v4 'state': ONLINE, OFFLINE or NEVER_SEEN
+                'online': sum(1 for gw in gateways if gw.get('state') == 'ONLINE')
+            },
+            'errors': errors,
+            'computedAt': datetime.utcnow().isoformat() + 'Z'
+        }
+
+
+tenant_dashboards = TenantDashboardStore()
 
 
-def load_servers():
-    """Load servers from JSON file"""
-    if not os.path.exists(SERVERS_FILE):
-        return {"servers": []}
+def parse_timestamp(value):
+    """ChirpStack RFC 3339 timestamp (e.g. 2024-05-01T12:00:00.123456789Z) to epoch seconds"""
+    if not value:
+        return None
+    # fromisoformat() wants an offset instead of 'Z' and at most microseconds
+    value = re.sub(r'(\.\d{6})\d+', r'\1', value.replace('Z', '+00:00'))
+    try:
+        stamp = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=timezone.utc)
+    return stamp.timestamp()
+
+
+def current_hour():
+    """Hours since the epoch (UTC) of the hour in progress"""
+    return int(time.time() // 3600)
+
+
+def hour_timestamp(hour):
+    return datetime.fromtimestamp(hour * 3600, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def parse_link_metrics(data, first_hour, hours):
+    """ChirpStack link metrics (HOUR aggregation) -> {column: `hours` values starting at first_hour}
+
+    Packet and error counts are summed over datasets (errors have one per error type),
+    RSSI / SNR averaged. RSSI / SNR of an hour without packets are 0 and never read.
+    """
+    columns = {column: [0.0] * hours for column in LINK_METRICS_COLUMNS}
+    sources = {'rx': 'rxPackets', 'errors': 'errors', 'rssi': 'gwRssi', 'snr': 'gwSnr'}
+    for column, name in sources.items():
+        metric = data.get(name) or {}
+        datasets = [dataset.get('data') or [] for dataset in metric.get('datasets') or []]
+        for i, stamp in enumerate(metric.get('timestamps') or []):
+            stamp = parse_timestamp(stamp)
+            index = int(stamp // 3600) - first_hour if stamp is not None else -1
+            values = [float(values[i]) for values in datasets if i < len(values)]
+            if not 0 <= index < hours or not values:
+                continue
+            columns[column][index] = sum(values) if column in ('rx', 'errors') else sum(values) / len(values)
+    return columns
+
+
+def estimated_loss(rx, lo, hi):
+    """Share of the expected uplinks missing from rx[lo:hi], None if it cannot be estimated.
+
+    The expected rate is the best complete day of the stored history, so this is an
+    estimate: it needs a day of history and the last stored hour (partial when it was
+    fetched) is left out.
+    """
+    complete = len(rx) - 1
+    hi = min(hi, complete)
+    best = max((sum(rx[end - 24:end]) for end in range(complete, 23, -24)), default=0)
+    if not best or hi <= lo:
+        return None
+    expected = best * (hi - lo) / 24
+    return round(max(0.0, 1 - sum(rx[lo:hi]) / expected), 3)
+
+
+class LinkMetricsStore:
+    """Hourly link metrics (packets, errors, RSSI, SNR) of every device of an application.
+
+    Each device has one float32 array per column, starting at its first stored hour and
+    trimmed to LINK_METRICS_RETENTION_HOURS; RSSI / SNR only count in hours with packets
+    (rx > 0), so summaries are C-level sums over the arrays. Collection only asks ChirpStack for the hours
+    after the last stored one, and the fleet summaries read by the analyze tool are
+    computed from memory (then cached until the next collection). Applications are
+    saved to LINK_METRICS_DIR as gzipped JSON, one file per (server, application).
+    """
+
+    def __init__(self, directory, retention_hours=LINK_METRICS_RETENTION_HOURS):
+        self.directory = directory
+        self.retention = max(24, retention_hours)
+        self._apps = {}  # (base_url, application_id) -> {'devices': {devEui: series}, 'collectedAt', 'generation', 'dirty'}
+        self._summaries = {}  # (base_url, application_id, hours) -> ((generation, hour), rows)
+        self._write_locks = defaultdict(threading.Lock)  # One writer per application file
+        self._lock = threading.Lock()
+
+    def _path(self, base_url, application_id):
+        server = hashlib.sha256(base_url.encode('utf-8')).hexdigest()[:12]
+        return os.path.join(self.directory, f"{server}-{re.sub(r'[^0-9A-Za-z_-]', '_', application_id)}.json.gz")
+
+    def _app(self, base_url, application_id):
+        """Application entry, read from disk on first use (caller holds the lock)"""
+        key = (base_url, application_id)
+        app = self._apps.get(key)
+        if app is not None:
+            return app
+        app = self._apps[key] = {'devices': {}, 'collectedAt': None, 'generation': 0, 'dirty': False}
+        path = self._path(base_url, application_id)
+        if not os.path.exists(path):
+            return app
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+            for dev_eui, stored in data['devices'].items():
+                series = {'start': int(stored['start'])}
+                for column in LINK_METRICS_COLUMNS:
+                    series[column] = array('f', stored[column])
+                app['devices'][dev_eui] = series
+            app['collectedAt'] = data.get('collectedAt')
+        except (OSError, EOFError, ValueError, KeyError, TypeError) as e:
+            print(f"[WARN] Metriques radio illisibles ({path}): {e}")
+            app['devices'] = {}
+        return app
+
+    def next_hour(self, base_url, application_id, dev_eui, now_hour):
+        """First hour to collect for a device: its last stored hour (partial when fetched) or the retention start"""
+        with self._lock:
+            series = self._app(base_url, application_id)['devices'].get(dev_eui.lower())
+        first = now_hour - self.retention + 1
+        if series is None:
+            return first
+        return max(first, series['start'] + len(series['rx']) - 1)
+
+    def merge(self, base_url, application_id, dev_eui, first_hour, columns):
+        """Store collected hours (LINK_METRICS_COLUMNS lists starting at first_hour) over the existing series"""
+        dev_eui = dev_eui.lower()
+        count = len(columns['rx'])
+        with self._lock:
+            app = self._app(base_url, application_id)
+            old = app['devices'].get(dev_eui)
+            start, end = first_hour, first_hour + count
+            if old is not None:
+                start, end = min(start, old['start']), max(end, old['start'] + len(old['rx']))
+            start = max(start, end - self.retention)
+            series = {'start': start}
+            for column in LINK_METRICS_COLUMNS:
+                values = array('f', [0.0]) * (end - start)
+                if old is not None:
+                    lo = max(start, old['start'])
+                    hi = min(end, old['start'] + len(old['rx']))
+                    if hi > lo:
+                        values[lo - start:hi - start] = old[column][lo - old['start']:hi - old['start']]
+                skip = max(0, start - first_hour)  # Collected hours already beyond the retention
+                values[first_hour + skip - start:first_hour + count - start] = array('f', columns[column][skip:])
+                series[column] = values
+            app['devices'][dev_eui] = series
+            app['generation'] += 1
+            app['dirty'] = True
+
+    def save(self, base_url, application_id, collected=False):
+        """Write an application to disk (temp file + rename) if it changed.
+
+        Writes of one application are serialized, so a flush() overlapping the end of a
+        collection cannot interleave in the temp file. The application stays dirty until
+        the file is replaced, and if it changed meanwhile.
+        """
+        with self._lock:
+            write_lock = self._write_locks[(base_url, application_id)]
+        with write_lock:
+            with self._lock:
+                app = self._app(base_url, application_id)
+                if collected:
+                    app['collectedAt'] = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+                if not app['dirty'] and not collected:
+                    return
+                generation = app['generation']
+                devices = {
+                    dev_eui: dict({column: [round(v, 1) for v in series[column]] for column in LINK_METRICS_COLUMNS},
+                                  start=series['start'])
+                    for dev_eui, series in app['devices'].items()
+                }
+                data = {'baseUrl': base_url, 'applicationId': application_id,
+                        'collectedAt': app['collectedAt'], 'devices': devices}
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(base_url, application_id)
+            with gzip.open(path + '.tmp', 'wt', encoding='utf-8', compresslevel=5) as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(path + '.tmp', path)
+            with self._lock:
+                if app['generation'] == generation:
+                    app['dirty'] = False
+
+    def flush(self):
+        with self._lock:
+            keys = [key for key, app in self._apps.items() if app['dirty']]
+        for base_url, application_id in keys:
+            self.save(base_url, application_id)
+
+    def summary(self, base_url, application_id, hours):
+        """(per-device rows over the last `hours` hours, collectedAt), cached until the next merge"""
+        now_hour = current_hour()
+        key = (base_url, application_id, hours)
+        with self._lock:
+            app = self._app(base_url, application_id)
+            version = (app['generation'], now_hour)
+            cached = self._summaries.get(key)
+            if cached is not None and cached[0] == version:
+                return cached[1], app['collectedAt']
+            devices = list(app['devices'].items())  # Series are replaced, never modified, by merge()
+            collected_at = app['collectedAt']
+        rows = [self._device_summary(dev_eui, series, now_hour, hours) for dev_eui, series in devices]
+        with self._lock:
+            self._summaries[key] = (version, rows)
+        return rows, collected_at
+
+    @staticmethod
+    def _device_summary(dev_eui, series, now_hour, hours):
+        lo = max(now_hour - hours + 1 - series['start'], 0)
+        hi = max(now_hour + 1 - series['start'], 0)
+        rx = series['rx'][lo:hi]
+        received = sum(rx)
+        row = {'devEui': dev_eui, 'hours': len(rx), 'rx': int(received),
+               'errors': int(sum(series['errors'][lo:hi])), 'silentHours': rx.count(0)}
+        for column in ('rssi', 'snr'):
+            values = series[column][lo:hi]
+            # Minimum over the hours with packets, average weighted by their packet count
+            row[f'{column}Min'] = round(min(itertools.compress(values, rx)), 1) if received else None
+            row[f'{column}Avg'] = round(sum(map(operator.mul, values, rx)) / received, 1) if received else None
+        row['loss'] = estimated_loss(series['rx'], lo, hi)
+        return row
+
+    def series(self, base_url, application_id, dev_eui, hours):
+        """Hourly values of one device over the last `hours` hours, None if not collected"""
+        with self._lock:
+            series = self._app(base_url, application_id)['devices'].get(dev_eui.lower())
+        if series is None:
+            return None
+        now_hour = current_hour()
+        lo = max(now_hour - hours + 1 - series['start'], 0)
+        hi = max(now_hour + 1 - series['start'], 0)
+        data = {'devEui': dev_eui.lower(), 'lastHour': hour_timestamp(series['start'] + len(series['rx']) - 1),
+                'timestamps': [hour_timestamp(series['start'] + i) for i in range(lo, min(hi, len(series['rx'])))]}
+        rx = series['rx'][lo:hi]
+        for column in LINK_METRICS_COLUMNS:
+            data[column] = [round(v, 1) if n or column in ('rx', 'errors') else None
+                            for v, n in zip(series[column][lo:hi], rx)]
+        return data
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'applications': len(self._apps),
+                'devices': sum(len(app['devices']) for app in self._apps.values()),
+                'retentionHours': self.retention
+            }
+
+
+link_metrics = LinkMetricsStore(LINK_METRICS_DIR)
+
+
+class RequestBodyReader(io.RawIOBase):
+    """Raw stream over a request body of known length, read from the socket as it is consumed"""
+
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.remaining = length
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.remaining <= 0:
+            return 0
+        data = self.rfile.read(min(len(buffer), self.remaining))
+        buffer[:len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+
+def count_outside_quotes(line, separator):
+    count = 0
+    in_quotes = False
+    for char in line:
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == separator and not in_quotes:
+            count += 1
+    return count
+
+
+def detect_separator(lines):
+    """Same heuristic as the browser: a separator found the same number of times on every line wins"""
+    lines = [line for line in lines if line.strip()][:5]
+    best, best_score = ';', 0
+    for separator in PARSE_SEPARATORS:
+        counts = [count_outside_quotes(line, separator) for line in lines]
+        score = 0
+        if counts and len(set(counts)) == 1:
+            score = counts[0] * 10
+        elif counts and all(counts):
+            score = min(counts)
+        if score > best_score:
+            best, best_score = separator, score
+    return best
+
+
+def open_csv_rows(stream, separator=None):
+    """Return (separator, row iterator) for a binary CSV stream. Quoted fields may contain separators and newlines."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    head = [line for line in (text.readline() for _ in range(5)) if line]
+    separator = separator or detect_separator(head)
+    return separator, csv.reader(itertools.chain(head, text), delimiter=separator)
+
+
+XLSX_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+XLSX_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+
+def xlsx_first_sheet(archive):
+    """Path of the first worksheet in the archive (workbook order, not file name)"""
     try:
-        with open(SERVERS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, IOError):
-        return {"servers": []}
+        workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+        sheet = workbook.find(f'{XLSX_NS}sheets/{XLSX_NS}sheet')
+        relation_id = sheet.get(f'{XLSX_REL_NS}id')
+        relations = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        for relation in relations:
+            if relation.get('Id') == relation_id:
+                target = relation.get('Target')
+                return target.lstrip('/') if target.startswith('/') else 'xl/' + target
+    except (KeyError, AttributeError, ET.ParseError):
+        pass
+    return 'xl/worksheets/sheet1.xml'
+
+
+def xlsx_column(reference):
+    """Zero-based column of a cell reference such as 'AB12'"""
+    column = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        column = column * 26 + ord(char.upper()) - ord('A') + 1
+    return column - 1
+
+
+def iter_xlsx_rows(fileobj):
+    """Rows of the first worksheet as lists of strings, parsed element by element"""
+    with zipfile.ZipFile(fileobj) as archive:
+        shared = []
+        if 'xl/sharedStrings.xml' in archive.namelist():
+            with archive.open('xl/sharedStrings.xml') as f:
+                for _, element in ET.iterparse(f):
+                    if element.tag == f'{XLSX_NS}si':
+                        shared.append(''.join(t.text or '' for t in element.iter(f'{XLSX_NS}t')))
+                        element.clear()
+
+        with archive.open(xlsx_first_sheet(archive)) as f:
+            sheet_data = None
+            for event, element in ET.iterparse(f, events=('start', 'end')):
+                if event == 'start':
+                    if element.tag == f'{XLSX_NS}sheetData':
+                        sheet_data = element
+                    continue
+                if element.tag != f'{XLSX_NS}row':
+                    continue
+                values = []
+                for cell in element.iter(f'{XLSX_NS}c'):
+                    reference = cell.get('r')
+                    column = xlsx_column(reference) if reference else len(values)
+                    values.extend([''] * (column - len(values)))
+                    cell_type = cell.get('t')
+                    if cell_type == 'inlineStr':
+                        value = ''.join(t.text or '' for t in cell.iter(f'{XLSX_NS}t'))
+                    else:
+                        value = cell.findtext(f'{XLSX_NS}v') or ''
+                        if cell_type == 's' and value:
+                            value = shared[int(value)]
+                        elif cell_type == 'b':
+                            value = 'true' if value == '1' else 'false'
+                    values.append(value)
+                # Parsed rows are dropped so memory stays flat on large sheets
+                element.clear()
+                if sheet_data is not None:
+                    sheet_data.remove(element)
+                yield values
+
+
+def filter_devices(devices, query):
+    """Filter and sort a device list with /api/inventory query parameters (q, deviceProfileId, tag, activity, sort, order)"""
+    text = query.get('q', [''])[0].strip().lower()
+    if text:
+        devices = [d for d in devices
+                   if text in (d.get('name') or '').lower() or text in (d.get('devEui') or '').lower()]
+    profile_id = query.get('deviceProfileId', [''])[0]
+    if profile_id:
+        devices = [d for d in devices if d.get('deviceProfileId') == profile_id]
+    tag = query.get('tag', [''])[0]
+    if tag:
+        key, _, value = tag.partition('=')
+        key, value = key.strip(), value.strip()
+        devices = [d for d in devices
+                   if key in (d.get('tags') or {}) and (not value or d['tags'][key] == value)]
+    activity = query.get('activity', [''])[0]
+    if activity in ('active', 'inactive', 'never'):
+        threshold = time.time() - DASHBOARD_ACTIVE_HOURS * 3600
+        statuses = {}
+        for d in devices:
+            last_seen = parse_timestamp(d.get('lastSeenAt'))
+            statuses[id(d)] = 'never' if last_seen is None else 'active' if last_seen >= threshold else 'inactive'
+        devices = [d for d in devices if statuses[id(d)] == activity]
+
+    sort = query.get('sort', [''])[0]
+    if sort in INVENTORY_SORT_FIELDS:
+        # Missing values (e.g. never seen) always last
+        present = [d for d in devices if d.get(sort)]
+        missing = [d for d in devices if not d.get(sort)]
+        present.sort(key=lambda d: str(d[sort]).lower(), reverse=query.get('order', ['asc'])[0] == 'desc')
+        devices = present + missing
+    return devices
+
+
+def query_inventory(devices, query):
+    """Filter, sort and page a device list with /api/inventory query parameters"""
+    devices = filter_devices(devices, query)
+    offset = max(0, int(query.get('offset', ['0'])[0] or 0))
+    limit = max(1, min(int(query.get('limit', ['100'])[0] or 100), INVENTORY_MAX_LIMIT))
+    return len(devices), devices[offset:offset + limit]
+
+
+def iter_with_keys(client, devices, concurrency=EXPORT_KEY_CONCURRENCY):
+    """Yield (device, deviceKeys) in order, with at most `concurrency` key requests in flight"""
+    def fetch(device):
+        try:
+            keys = client.call('GET', f"/api/devices/{device['devEui']}/keys").get('deviceKeys') or {}
+        except ChirpStackError:
+            return {}  # No keys for this device
+        device_inventories.record_keys(client.base_url, device['devEui'], keys)  # Spares a re-import these reads
+        return keys
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='export') as executor:
+        window = deque()
+        for device in devices:
+            window.append((device, executor.submit(fetch, device)))
+            if len(window) >= concurrency:
+                device, future = window.popleft()
+                yield device, future.result()
+        while window:
+            device, future = window.popleft()
+            yield device, future.result()
+
+
+def export_table(client, devices, tag_keys, include_keys):
+    """Header row, then one row per device (same columns as the former browser export)"""
+    yield EXPORT_COLUMNS + tag_keys + (['nwk_key', 'app_key'] if include_keys else [])
+    pairs = iter_with_keys(client, devices) if include_keys else ((d, None) for d in devices)
+    for d, keys in pairs:
+        tags = d.get('tags') or {}
+        row = [d.get('devEui', ''), d.get('name') or '', d.get('description') or '',
+               d.get('deviceProfileId') or '', d.get('deviceProfileName') or '',
+               d.get('createdAt') or '', d.get('lastSeenAt') or '']
+        row.extend(tags.get(k) or '' for k in tag_keys)
+        if keys is not None:
+            row.extend([keys.get('nwkKey') or '', keys.get('appKey') or ''])
+        yield row
+
+
+def write_csv_export(out, rows):
+    """Semicolon-separated, every cell quoted; written every EXPORT_FLUSH_ROWS rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';', quoting=csv.QUOTE_ALL, lineterminator='\n')
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % EXPORT_FLUSH_ROWS == 0:
+            out.write(buffer.getvalue().encode('utf-8'))
+            buffer.seek(0)
+            buffer.truncate()
+    out.write(buffer.getvalue().encode('utf-8'))
+
+
+XML_INVALID_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def xlsx_column_name(index):
+    name = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        name = chr(ord('A') + remainder) + name
+    return name
+
+
+def write_xlsx_export(out, rows, sheet_name='Devices'):
+    """Minimal XLSX (inline strings, no shared string table) zipped straight to an unseekable stream"""
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml',
+                         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                         '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                         '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                         '<Default Extension="xml" ContentType="application/xml"/>'
+                         '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                         '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                         '</Types>')
+        archive.writestr('_rels/.rels',
+                         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                         '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                         '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+                         '</Relationships>')
+        archive.writestr('xl/workbook.xml',
+                         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                         f'<workbook xmlns="{XLSX_NS[1:-1]}" xmlns:r="{XLSX_REL_NS[1:-1]}">'
+                         f'<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        archive.writestr('xl/_rels/workbook.xml.rels',
+                         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                         '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                         '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+                         '</Relationships>')
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                         f'<worksheet xmlns="{XLSX_NS[1:-1]}"><sheetData>').encode('utf-8'))
+            columns = []
+            chunk = []
+            for number, row in enumerate(rows, 1):
+                columns.extend(xlsx_column_name(i) for i in range(len(columns), len(row)))
+                cells = ''.join(
+                    f'<c r="{columns[i]}{number}" t="inlineStr"><is><t xml:space="preserve">'
+                    f'{xml_escape(XML_INVALID_CHARS.sub("", str(value)))}</t></is></c>'
+                    for i, value in enumerate(row) if value != '')
+                chunk.append(f'<row r="{number}">{cells}</row>')
+                if len(chunk) >= EXPORT_FLUSH_ROWS:
+                    sheet.write(''.join(chunk).encode('utf-8'))
+                    chunk = []
+            sheet.write((''.join(chunk) + '</sheetData></worksheet>').encode('utf-8'))
+
+
+class ExportTickets:
+    """One-time download links: a browser download cannot send the ChirpStack headers,
+    so POST /api/export stores them (in memory) behind a short-lived ticket."""
+
+    def __init__(self, ttl=EXPORT_TICKET_TTL):
+        self.ttl = ttl
+        self._tickets = {}  # id -> (expires, client, query)
+        self._lock = threading.Lock()
+
+    def create(self, client, query):
+        ticket = uuid.uuid4().hex
+        now = time.monotonic()
+        with self._lock:
+            for key in [k for k, (expires, _, _) in self._tickets.items() if expires < now]:
+                del self._tickets[key]
+            self._tickets[ticket] = (now + self.ttl, client, query)
+        return ticket
+
+    def take(self, ticket):
+        """Return (client, query) and forget the ticket, or None if unknown or expired"""
+        with self._lock:
+            entry = self._tickets.pop(ticket, None)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1], entry[2]
+
+
+export_tickets = ExportTickets()
+
+
+def import_device(client, item):
+    """Create one device (and its keys) from an import item, return the per-row result.
+
+    item: {"row": 2, "device": {...}, "keys": {...} (optional), "replace": bool (optional)}
+    """
+    device = item.get('device') or {}
+    dev_eui = device.get('dev_eui') or device.get('devEui') or ''
+    result = {'row': item.get('row'), 'devEui': dev_eui, 'name': device.get('name') or dev_eui}
+
+    if item.get('replace'):
+        try:
+            client.call('DELETE', f'/api/devices/{dev_eui}')
+            result['replaced'] = True
+        except ChirpStackError as e:
+            result['status'] = 'error'
+            result['error'] = f"Echec suppression: {e}"
+            return result
 
+    try:
+        client.call('POST', '/api/devices', {'device': device})
+    except ChirpStackError as e:
+        result['status'] = 'error'
+        result['error'] = str(e)
+        return result
+    result['status'] = 'created'
+
+    keys = item.get('keys')
+    if keys:
+        try:
+            client.call('POST', f'/api/devices/{dev_eui}/keys', {'device_keys': keys})
+            result['keys'] = True
+        except ChirpStackError as e:
+            result['keyError'] = str(e)
+    return result
+
+
+def changed_device_fields(current, device):
+    """IMPORT_PLAN_FIELDS of an import device (snake_case or camelCase) that differ from a ChirpStack device"""
+    changed = []
+    for field, alias in IMPORT_PLAN_FIELDS:
+        value = device.get(alias, device.get(field))
+        if value is None or (field == 'deviceProfileId' and not value):
+            continue  # Not given by the file: left as it is
+        if field == 'tags':
+            if dict(value) != (current.get('tags') or {}):
+                changed.append(field)
+        elif str(value) != (current.get(field) or ''):
+            changed.append(field)
+    return changed
+
+
+def plan_import(client, application_id, items, concurrency=IMPORT_CONCURRENCY):
+    """Classify import items against the devices of an application, one plan entry per item.
+
+    The items are joined on lowercase DevEUI with the cached inventory (one paged
+    listing, shared with the other tools). Keys of existing devices are compared
+    through the digests device_inventories keeps of the keys it has written or
+    read: only keys it has never seen are read from ChirpStack.
+
+    entry: {"action": "create" | "unchanged" | "update", "fields": [changed fields],
+    "keys": bool (keys differ), "hasKeys": bool, "existing": cached list item or None}
+    """
+    inventory, _ = device_inventories.get(client, application_id)
+    plan = []
+    unknown_keys = []
+    for item in items:
+        device = item.get('device') or {}
+        dev_eui = (device.get('dev_eui') or device.get('devEui') or '').lower()
+        existing = inventory.get_device(dev_eui) if dev_eui else None
+        entry = {'action': 'create', 'fields': [], 'keys': False, 'hasKeys': False, 'existing': existing}
+        plan.append(entry)
+        if existing is None:
+            continue
+        entry['fields'] = changed_device_fields(existing, device)
+        wanted = normalized_keys(item.get('keys'))
+        if wanted:
+            known = device_inventories.known_keys(client.base_url, dev_eui)
+            if known is None:
+                unknown_keys.append((entry, dev_eui, wanted))
+            else:
+                entry['hasKeys'] = bool(known)
+                entry['keys'] = any(known.get(f) != key_digest(v) for f, v in wanted.items())
 
-def save_servers(data):
-    """Save servers to JSON file"""
-    ensure_data_dir()
-    with open(SERVERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    def read_keys(args):
+        entry, dev_eui, wanted = args
+        try:
+            keys = normalized_keys(client.call('GET', f'/api/devices/{dev_eui}/keys').get('deviceKeys'))
+        except ChirpStackError as e:
+            if e.status != 404:
+                entry['hasKeys'] = entry['keys'] = True  # Unreadable: write them, a write is always right
+                return
+            keys = {}
+        device_inventories.record_keys(client.base_url, dev_eui, keys)
+        entry['hasKeys'] = bool(keys)
+        entry['keys'] = any(keys.get(f) != v for f, v in wanted.items())
+
+    bounded_map(read_keys, unknown_keys, concurrency)
+    for entry in plan:
+        if entry['existing'] is not None:
+            entry['action'] = 'update' if entry['fields'] or entry['keys'] else 'unchanged'
+    return plan
+
+
+def apply_import_plan(client, item, entry, existing='update'):
+    """Make the calls a planned import item needs, return its per-row result (like import_device).
+
+    create: POST device + keys. unchanged: nothing. update: GET + PUT of the device
+    if fields changed (in place: the device keeps its frame counters and session),
+    PUT of the keys (POST if it had none) if they changed.
+    existing='skip' leaves devices already in the application untouched.
+    """
+    if entry['action'] == 'create':
+        return import_device(client, item)
+    device = item.get('device') or {}
+    dev_eui = (device.get('dev_eui') or device.get('devEui') or '').lower()
+    result = {'row': item.get('row'), 'devEui': dev_eui, 'name': device.get('name') or dev_eui}
+    if existing == 'skip' or entry['action'] == 'unchanged':
+        result['status'] = 'skipped' if existing == 'skip' else 'unchanged'
+        return result
+
+    if entry['fields']:
+        try:
+            current = client.call('GET', f'/api/devices/{dev_eui}')['device']
+            for field, alias in IMPORT_PLAN_FIELDS:
+                if field in entry['fields']:
+                    current[field] = device.get(alias, device.get(field))
+            client.call('PUT', f'/api/devices/{dev_eui}', {'device': current})
+        except ChirpStackError as e:
+            result['status'] = 'error'
+            result['error'] = str(e)
+            return result
+    result['status'] = 'updated'
+    result['fields'] = entry['fields']
+
+    if entry['keys']:
+        try:
+            client.call('PUT' if entry['hasKeys'] else 'POST', f'/api/devices/{dev_eui}/keys',
+                        {'device_keys': item['keys']})
+            result['keys'] = True
+        except ChirpStackError as e:
+            result['keyError'] = str(e)
+    return result
+
+
+def job_import_device(client, params, item):
+    """Job step 'import': create a device and its keys (see import_device).
+
+    With params.existing ('update' or 'skip') and params.applicationId the row is
+    first reconciled with the application, as POST /api/import does, using the
+    plan entry prepare_import_job made for it.
+    """
+    existing = params.get('existing')
+    if existing:
+        entry = item.get('plan') or plan_import(client, params['applicationId'], [item], concurrency=1)[0]
+        return apply_import_plan(client, item, entry, existing)
+    return import_device(client, item)
+
+
+def prepare_import_job(job, client, indices):
+    """Plan the rows of an 'import' job with params.existing in one pass before they run.
+
+    Planning row by row would list the application again after each created
+    device (creations invalidate the cached inventory).
+    """
+    if not job.params.get('existing'):
+        return {}
+    plan = plan_import(client, job.params['applicationId'], [job.items[i] for i in indices], job.concurrency)
+    return {index: {'plan': entry} for index, entry in zip(indices, plan)}
+
+
+def job_delete_device(client, params, item):
+    """Job step 'delete': delete a device"""
+    client.call('DELETE', f"/api/devices/{item['devEui']}")
+    return {}
+
+
+def updated_tags(current, tags, mode):
+    """Tags a device should have after a 'tags' job item (merge or replace)"""
+    if mode == 'replace':
+        return dict(tags or {})
+    return {**(current or {}), **(tags or {})}
+
+
+def job_update_tags(client, params, item):
+    """Job step 'tags': merge or replace the tags of a device, skipping no-op writes.
+
+    With params.applicationId the application's device list (one paged scan, shared
+    through the inventory cache) tells which devices already have the wanted tags:
+    those cost no request at all. The others are read and only written if the
+    tags really differ.
+    """
+    dev_eui = item['devEui']
+    mode = params.get('mode')
+    if params.get('applicationId'):
+        inventory, _ = device_inventories.get(client, params['applicationId'])
+        listed = inventory.get_device(dev_eui)
+        if listed is not None:
+            current = listed.get('tags') or {}
+            if updated_tags(current, item.get('tags'), mode) == current:
+                return {'name': listed.get('name') or dev_eui, 'unchanged': True}
+
+    device = client.call('GET', f'/api/devices/{dev_eui}')['device']
+    current = device.get('tags') or {}
+    tags = updated_tags(current, item.get('tags'), mode)
+    if tags == current:
+        return {'name': device.get('name') or dev_eui, 'unchanged': True}
+    device['tags'] = tags
+    client.call('PUT', f'/api/devices/{dev_eui}', {'device': device})
+    return {'name': device.get('name') or dev_eui}
+
+
+def job_change_device_profile(client, params, item):
+    """Job step 'device-profile': move a device to another device profile"""
+    dev_eui = item['devEui']
+    device = client.call('GET', f'/api/devices/{dev_eui}')['device']
+    device['deviceProfileId'] = params['deviceProfileId']
+    client.call('PUT', f'/api/devices/{dev_eui}', {'device': device})
+    return {'name': device.get('name') or dev_eui}
+
+
+class MigrationJournal:
+    """Append-only journal of device snapshots taken before a migration deletes them.
+
+    A snapshot is written (and fsynced) before the DELETE and closed once the device
+    and its keys exist in the destination application. Snapshots still open after a
+    crash or an error are replayed by the next migration of the same device (job
+    resume), so a device is never lost between DELETE and POST.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._pending = None  # devEui -> {"device": ..., "keys": ...}, loaded on first use
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._pending is not None:
+            return
+        self._pending = {}
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Truncated last line (crash while writing)
+                if entry.get('done'):
+                    self._pending.pop(entry['devEui'], None)
+                else:
+                    self._pending[entry['devEui']] = {'device': entry['device'], 'keys': entry.get('keys')}
+
+    def _append(self, entry):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def get(self, dev_eui):
+        with self._lock:
+            self._load()
+            return self._pending.get(dev_eui.lower())
+
+    def record(self, dev_eui, device, keys):
+        with self._lock:
+            self._load()
+            self._append({'devEui': dev_eui.lower(), 'device': device, 'keys': keys,
+                          'at': datetime.utcnow().isoformat() + 'Z'})
+            self._pending[dev_eui.lower()] = {'device': device, 'keys': keys}
+
+    def close(self, dev_eui):
+        with self._lock:
+            self._load()
+            if self._pending.pop(dev_eui.lower(), None) is None:
+                return
+            if self._pending:
+                self._append({'devEui': dev_eui.lower(), 'done': True})
+            else:
+                # Nothing left to replay: start a fresh journal
+                open(self.path, 'w').close()
+
+    def get_stats(self):
+        with self._lock:
+            self._load()
+            return {'pending': sorted(self._pending)}
+
+
+migration_journal = MigrationJournal(MIGRATION_JOURNAL)
+
+
+def device_exists(client, dev_eui):
+    """True only if ChirpStack confirms the device exists (False on 404 or any error)"""
+    try:
+        client.call('GET', f'/api/devices/{dev_eui}')
+        return True
+    except ChirpStackError:
+        return False
+
+
+def job_migrate_device(client, params, item):
+    """Job step 'migrate': recreate a device (and its keys) in another application.
+
+    The device and its keys are journaled before the DELETE; if a snapshot is already
+    open for this device (crash or error during a previous attempt) it is replayed
+    instead of being read again from ChirpStack, which may no longer have it. Keys that
+    could not be restored are reported as keyError and keep the snapshot open, so
+    migrating the device again restores them - without deleting it again, which
+    would reset its frame counters once more.
+
+    Each device is one read/journal/delete/recreate chain; the job runs `concurrency`
+    of them at once, so reads of some devices overlap deletes and recreations of
+    others. A separate prefetch pass would make the same calls, hold every snapshot
+    in memory and read devices long before deleting them.
+    """
+    dev_eui = item['devEui']
+    result = {}
+    snapshot = migration_journal.get(dev_eui)
+    if snapshot is None:
+        device = client.call('GET', f'/api/devices/{dev_eui}')['device']
+        try:
+            keys = client.call('GET', f'/api/devices/{dev_eui}/keys').get('deviceKeys')
+        except ChirpStackError:
+            keys = None  # No keys for this device
+        migration_journal.record(dev_eui, device, keys)
+    else:
+        device, keys = snapshot['device'], snapshot['keys']
+        result['replayed'] = True
+        try:
+            current = client.call('GET', f'/api/devices/{dev_eui}')['device']
+        except ChirpStackError as e:
+            if e.status != 404:
+                raise
+            current = None
+        if current is not None and current.get('applicationId') == params['applicationId']:
+            # Already recreated by the previous attempt, only its keys are missing
+            if keys:
+                try:
+                    client.call('POST', f'/api/devices/{dev_eui}/keys', {'deviceKeys': keys})
+                except ChirpStackError as e:
+                    if e.status != 409:
+                        result['keyError'] = str(e)
+                        return result
+                    client.call('PUT', f'/api/devices/{dev_eui}/keys', {'deviceKeys': keys})
+            migration_journal.close(dev_eui)
+            return result
+
+    try:
+        client.call('DELETE', f'/api/devices/{dev_eui}')
+    except ChirpStackError as e:
+        if snapshot is None:
+            # The device is still in the source application: nothing to replay. Without
+            # an answer (network error, 504) the DELETE may have gone through, so check.
+            if e.status not in (502, 504) or device_exists(client, dev_eui):
+                migration_journal.close(dev_eui)
+            raise
+        if e.status != 404:
+            raise  # 404 on replay: already deleted before the interruption
+    try:
+        client.call('POST', '/api/devices', {'device': {**device, 'applicationId': params['applicationId']}})
+    except ChirpStackError as e:
+        # Put the device back where it was rather than leaving it deleted
+        try:
+            client.call('POST', '/api/devices', {'device': device})
+            if keys:
+                client.call('POST', f'/api/devices/{dev_eui}/keys', {'deviceKeys': keys})
+        except ChirpStackError:
+            raise e  # Snapshot stays open for a later replay
+        migration_journal.close(dev_eui)
+        raise ChirpStackError(e.status, f"{e.message} (device remis dans l'application source)")
+
+    if keys:
+        try:
+            client.call('POST', f'/api/devices/{dev_eui}/keys', {'deviceKeys': keys})
+        except ChirpStackError as e:
+            # The device is migrated; the snapshot stays open to restore its keys later
+            result['keyError'] = str(e)
+            return result
+    migration_journal.close(dev_eui)
+    return result
+
+
+def job_collect_link_metrics(client, params, item):
+    """Job step 'link-metrics': fetch the hours of link metrics missing from the local store.
+
+    A device not seen since its last stored hour gets empty hours without asking ChirpStack.
+    """
+    application_id = params['applicationId']
+    dev_eui = item['devEui'].lower()
+    now_hour = current_hour()
+    first_hour = link_metrics.next_hour(client.base_url, application_id, dev_eui, now_hour)
+    hours = now_hour - first_hour + 1
+    last_seen = parse_timestamp(item.get('lastSeenAt'))
+    if last_seen is None or last_seen < first_hour * 3600:
+        columns = {column: [0.0] * hours for column in LINK_METRICS_COLUMNS}
+        link_metrics.merge(client.base_url, application_id, dev_eui, first_hour, columns)
+        return {'hours': hours, 'fetched': False}
+    query = (f"start={quote(hour_timestamp(first_hour))}&end={quote(datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'))}"
+             f"&aggregation=HOUR")
+    data = client.call('GET', f"/api/devices/{dev_eui}/link-metrics?{query}")
+    link_metrics.merge(client.base_url, application_id, dev_eui, first_hour,
+                       parse_link_metrics(data, first_hour, hours))
+    return {'hours': hours, 'fetched': True}
+
+
+# kind -> (step function, required params)
+JOB_HANDLERS = {
+    'import': (job_import_device, ()),
+    'delete': (job_delete_device, ()),
+    'tags': (job_update_tags, ()),
+    'device-profile': (job_change_device_profile, ('deviceProfileId',)),
+    'migrate': (job_migrate_device, ('applicationId',)),
+    'link-metrics': (job_collect_link_metrics, ('applicationId',)),
+}
+
+
+def finish_link_metrics(job):
+    """Save the collected metrics and compute the summaries the analyze tool asks for next"""
+    link_metrics.save(job.url, job.params['applicationId'], collected=True)
+    for hours in LINK_METRICS_PERIODS.values():
+        link_metrics.summary(job.url, job.params['applicationId'], hours)
+
+
+# kind -> function(job, client, pending indices) -> {index: extra item fields}, called before the items run
+JOB_PREPARERS = {
+    'import': prepare_import_job,
+}
+
+# kind -> function(job) called once the items have run (even partially)
+JOB_FINISHERS = {
+    'link-metrics': finish_link_metrics,
+}
+
+JOB_FINAL_STATUSES = ('completed', 'failed', 'cancelled', 'interrupted')
+
+
+class Job:
+    """A bulk operation: a list of items processed by one JOB_HANDLERS step each.
+
+    Metadata is saved to {id}.json, each finished item is appended to
+    {id}.results.jsonl so the job can resume where it stopped. The API token is
+    only kept in memory: after a restart the job must be resumed by a client.
+    """
+
+    def __init__(self, jobs_dir, data):
+        self.jobs_dir = jobs_dir
+        self.id = data['id']
+        self.kind = data['kind']
+        self.url = data['url']
+        self.params = data.get('params') or {}
+        self.items = data.get('items') or []
+        self.concurrency = data.get('concurrency') or IMPORT_CONCURRENCY
+        self.status = data.get('status', 'queued')
+        self.error = data.get('error')
+        self.created_at = data.get('createdAt')
+        self.updated_at = data.get('updatedAt')
+        self.results = []
+        self.done = set()
+        self.success = 0
+        self.auth_header = ''
+        self.cancel_requested = False
+        self.condition = threading.Condition()
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.jobs_dir, f'{self.id}.json')
+
+    @property
+    def results_path(self):
+        return os.path.join(self.jobs_dir, f'{self.id}.results.jsonl')
+
+    def save(self):
+        """Write metadata atomically (temp file + rename)"""
+        self.updated_at = datetime.utcnow().isoformat() + 'Z'
+        data = {
+            'id': self.id, 'kind': self.kind, 'url': self.url, 'params': self.params,
+            'items': self.items, 'concurrency': self.concurrency, 'status': self.status,
+            'error': self.error, 'createdAt': self.created_at, 'updatedAt': self.updated_at
+        }
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.meta_path)
+
+    def load_results(self):
+        """Reload finished items from the results journal"""
+        if not os.path.exists(self.results_path):
+            return
+        with open(self.results_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Truncated last line (crash while writing)
+                self._record(result)
+
+    def _record(self, result):
+        if result['index'] in self.done:
+            return
+        self.done.add(result['index'])
+        self.results.append(result)
+        if result.get('status') != 'error':
+            self.success += 1
+
+    def add_result(self, result):
+        with self.condition:
+            with open(self.results_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(result, ensure_ascii=False) + '\n')
+            self._record(result)
+            self.condition.notify_all()
+
+    def set_status(self, status, error=None):
+        with self.condition:
+            self.status = status
+            self.error = error
+            self.save()
+            self.condition.notify_all()
+
+    def wait_results(self, position, timeout):
+        """Block until results after `position` exist or the job ends -> (new results, finished)"""
+        with self.condition:
+            if len(self.results) <= position and self.status not in JOB_FINAL_STATUSES:
+                self.condition.wait(timeout)
+            results = self.results[position:]
+            return results, self.status in JOB_FINAL_STATUSES
+
+    def summary(self):
+        with self.condition:
+            return {
+                'id': self.id, 'kind': self.kind, 'status': self.status, 'error': self.error,
+                'params': self.params, 'concurrency': self.concurrency,
+                'total': len(self.items), 'done': len(self.done),
+                'success': self.success, 'errors': len(self.done) - self.success,
+                'createdAt': self.created_at, 'updatedAt': self.updated_at
+            }
+
+
+class JobManager:
+    """Queue of persistent jobs run by a pool of JOB_WORKERS threads"""
+
+    def __init__(self, jobs_dir, workers=JOB_WORKERS):
+        self.jobs_dir = jobs_dir
+        self.workers = max(1, workers)
+        self.jobs = {}
+        self.stopping = False
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._threads = []
+
+    def start(self):
+        """Reload jobs from disk (unfinished ones become 'interrupted') and start the workers"""
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        for filename in sorted(os.listdir(self.jobs_dir)):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.jobs_dir, filename), 'r', encoding='utf-8') as f:
+                    job = Job(self.jobs_dir, json.load(f))
+            except (json.JSONDecodeError, KeyError, IOError):
+                continue
+            job.load_results()
+            if job.status not in JOB_FINAL_STATUSES:
+                job.set_status('interrupted', 'Serveur redemarre pendant le traitement')
+            self.jobs[job.id] = job
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'job-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop taking items; running jobs end as 'interrupted' and can be resumed later"""
+        self.stopping = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for job in list(self.jobs.values()):
+            with job.condition:
+                job.condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=UPSTREAM_TIMEOUT)
+
+    def submit(self, kind, url, auth_header, params, items, concurrency):
+        now = datetime.utcnow().isoformat() + 'Z'
+        job = Job(self.jobs_dir, {
+            'id': uuid.uuid4().hex, 'kind': kind, 'url': url, 'params': params,
+            'items': items, 'concurrency': concurrency, 'status': 'queued', 'createdAt': now
+        })
+        job.auth_header = auth_header
+        job.save()
+        with self._lock:
+            self.jobs[job.id] = job
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            jobs = list(self.jobs.values())
+        return sorted((job.summary() for job in jobs), key=lambda j: j['createdAt'] or '', reverse=True)
+
+    def cancel(self, job):
+        job.cancel_requested = True
+        if job.status == 'queued':
+            job.set_status('cancelled')
+
+    def resume(self, job, auth_header):
+        job.auth_header = auth_header
+        job.cancel_requested = False
+        job.set_status('queued')
+        self._queue.put(job)
+
+    def delete(self, job):
+        with self._lock:
+            self.jobs.pop(job.id, None)
+        for path in (job.meta_path, job.results_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            if not self._claim(job):
+                continue
+            try:
+                self._run(job)
+            except Exception as e:
+                job.set_status('failed', str(e))
+
+    def _claim(self, job):
+        """Move a queued job to 'running'. A job cancelled then resumed while waiting is in
+        the queue twice: only the first worker to dequeue it gets it."""
+        with job.condition:
+            if job.status != 'queued':
+                return False  # Cancelled while waiting, or already claimed
+            job.set_status('running')
+            return True
+
+    def _run(self, job):
+        step, _ = JOB_HANDLERS[job.kind]
+        client = ChirpStackClient(job.url, job.auth_header)
+
+        pending = [i for i in range(len(job.items)) if i not in job.done]
+        prepared = JOB_PREPARERS[job.kind](job, client, pending) if job.kind in JOB_PREPARERS and pending else {}
+        with ThreadPoolExecutor(max_workers=job.concurrency, thread_name_prefix=f'job-{job.id[:8]}') as executor:
+            in_flight = set()
+            for index in pending:
+                if job.cancel_requested or self.stopping:
+                    break
+                if len(in_flight) >= job.concurrency:
+                    _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                in_flight.add(executor.submit(self._run_item, job, step, client, index, prepared.get(index)))
+            wait(in_flight)
+
+        if job.kind in JOB_FINISHERS:
+            JOB_FINISHERS[job.kind](job)
+        if self.stopping and len(job.done) < len(job.items):
+            job.set_status('interrupted', 'Serveur arrete pendant le traitement')
+        elif job.cancel_requested and len(job.done) < len(job.items):
+            job.set_status('cancelled')
+        else:
+            job.set_status('completed')
+
+    def _run_item(self, job, step, client, index, extra=None):
+        item = {**job.items[index], **extra} if extra else job.items[index]
+        device = item.get('device') or {}
+        dev_eui = item.get('devEui') or device.get('dev_eui') or device.get('devEui') or ''
+        result = {'index': index, 'devEui': dev_eui, 'name': item.get('name') or device.get('name') or dev_eui}
+        try:
+            result.update(step(client, job.params, item) or {})
+        except ChirpStackError as e:
+            result['status'] = 'error'
+            result['error'] = str(e)
+        except Exception as e:
+            result['status'] = 'error'
+            result['error'] = f"500: {e}"
+        result.setdefault('status', 'success')
+        job.add_result(result)
+
+
+job_manager = JobManager(JOBS_DIR)
+
+
+def parse_position(value):
+    """Result position from a query string or Last-Event-ID ('' -> 0), None if invalid"""
+    try:
+        position = int(value or 0)
+    except ValueError:
+        return None
+    return position if position >= 0 else None
+
+
+stream_slots = threading.BoundedSemaphore(max(1, MAX_STREAMS))  # See ProxyHandler.run_long_request
 
 
 class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
+    def setup(self):
+        super().setup()
+        self.wfile = CountingWriter(self.wfile)
+
+    def handle_one_request(self):
+        """Handle one request and record it in proxy_metrics"""
+        self.response_status = None
+        started = time.monotonic()
+        proxy_metrics.request_started()
+        try:
+            super().handle_one_request()
+        finally:
+            path = getattr(self, 'path', '')
+            method = getattr(self, 'command', None)
+            if method:
+                try:
+                    bytes_in = int(self.headers.get('Content-Length', 0))
+                except (AttributeError, ValueError):
+                    bytes_in = 0
+                proxy_metrics.request_finished(route_label(path), method, self.response_status,
+                                               time.monotonic() - started, bytes_in, self.wfile.count)
+                self.wfile.count = 0
+            else:
+                proxy_metrics.request_cancelled()  # Connection closed without a request
+
+    def send_response_only(self, code, message=None):
+        self.response_status = code
+        super().send_response_only(code, message)
+
     def do_OPTIONS(self):
         """Handle CORS preflight requests"""
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Grpc-Metadata-Authorization, Authorization')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Grpc-Metadata-Authorization, Authorization, X-Chirpstack-Url')
         self.send_header('Access-Control-Max-Age', '86400')
         self.end_headers()
 
@@ -90,13 +2932,111 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             self.handle_get_profiles()
         elif self.path == '/api/servers' or self.path.startswith('/api/servers?'):
             self.handle_get_servers()
+        elif self.path == '/api/stats':
+            self.handle_get_stats()
+        elif self.path == '/api/jobs' or self.path.startswith('/api/jobs/'):
+            self.handle_get_jobs()
+        elif self.path == '/api/inventory' or self.path.startswith('/api/inventory?'):
+            self.handle_get_inventory()
+        elif self.path == '/api/search' or self.path.startswith('/api/search?'):
+            self.handle_search()
+        elif self.path == '/api/dashboard' or self.path.startswith('/api/dashboard?'):
+            self.handle_dashboard()
+        elif self.path == '/api/export' or self.path.startswith('/api/export?'):
+            self.run_long_request(self.handle_export)
+        elif self.path == '/api/link-metrics' or self.path.startswith('/api/link-metrics?'):
+            self.handle_link_metrics()
+        elif self.path == '/metrics':
+            self.handle_metrics()
         elif self.path == '/health':
             self.handle_health_check()
         else:
             # Serve static files
             if self.path == '/':
                 self.path = '/main.html'
-            super().do_GET()
+            self.serve_static()
+
+    def serve_static(self):
+        """Static file from memory, gzip / brotli compressed if accepted, with strong ETag / 304"""
+        path = self.translate_path(self.path)
+        entry = static_files.get(path) if is_compressible(self.guess_type(path)) else None
+        if entry is None:
+            super().do_GET()  # Directory listing, binary or large file, 404...
+            return
+
+        encoding = next((e for e in accepted_encodings(self.headers.get('Accept-Encoding'))
+                         if e in entry['bodies']), 'identity')
+        etag = f'"{entry["etag"]}"' if encoding == 'identity' else f'"{entry["etag"]}-{encoding}"'
+        if_none_match = [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]
+        not_modified = '*' in if_none_match or any(
+            (tag[2:] if tag.startswith('W/') else tag).strip('"').split('-')[0] == entry['etag']
+            for tag in if_none_match)
+
+        self.send_response(304 if not_modified else 200)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')  # Revalidate on each load: a new main.html is seen at once
+        self.send_header('Vary', 'Accept-Encoding')
+        if not_modified:
+            self.end_headers()
+            return
+        body = entry['bodies'][encoding]
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Length', len(body))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def write_body(self, body, content_type='application/json', encoded=None):
+        """Send Content-Type / Content-Length, end the headers and write body.
+
+        Bodies of at least COMPRESS_MIN_SIZE bytes are compressed with brotli or
+        gzip when the client accepts it. encoded (dict) memoizes the compressed
+        versions, so a cached upstream response is only compressed once.
+        """
+        if COMPRESS_MIN_SIZE and len(body) >= COMPRESS_MIN_SIZE and is_compressible(content_type):
+            self.send_header('Vary', 'Accept-Encoding')
+            encodings = accepted_encodings(self.headers.get('Accept-Encoding'))
+            if encodings:
+                encoding = encodings[0]
+                compressed = encoded.get(encoding) if encoded is not None else None
+                if compressed is None:
+                    compressed = compress(body, encoding)
+                    if encoded is not None:
+                        encoded[encoding] = compressed
+                body = compressed
+                self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', len(body))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def write_stream(self, stream):
+        """Relay an UpstreamStream body chunk by chunk, after send_response().
+
+        Content-Length is forwarded when ChirpStack sent it. A compressed body, or
+        one of unknown length, is delimited by closing the connection (HTTP/1.0).
+        """
+        content_type = stream.headers.get('Content-Type', 'application/json')
+        compress_chunk = finish = None
+        if COMPRESS_MIN_SIZE and is_compressible(content_type) and \
+                (stream.length is None or stream.length >= COMPRESS_MIN_SIZE):
+            self.send_header('Vary', 'Accept-Encoding')
+            encodings = accepted_encodings(self.headers.get('Accept-Encoding'))
+            if encodings:
+                compress_chunk, finish = stream_compressor(encodings[0])
+                self.send_header('Content-Encoding', encodings[0])
+        self.send_header('Content-Type', content_type)
+        if stream.length is not None and compress_chunk is None:
+            self.send_header('Content-Length', stream.length)
+        self.end_headers()
+
+        for chunk in stream.chunks():
+            data = compress_chunk(chunk) if compress_chunk else chunk
+            if data:
+                self.wfile.write(data)
+        if finish:
+            self.wfile.write(finish())
 
     def handle_health_check(self):
         """Endpoint de health check pour Docker/Kubernetes"""
@@ -109,7 +3049,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
     def handle_get_profiles(self):
         """Return all profiles"""
-        data = load_profiles()
+        data = {'profiles': profile_store.list()}
         response = json.dumps(data).encode('utf-8')
         self.send_response(200)
         self.send_header('Content-Type', 'application/json')
@@ -119,7 +3059,25 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
     def handle_get_servers(self):
         """Return all saved servers"""
-        data = load_servers()
+        data = {'servers': server_store.list()}
+        response = json.dumps(data).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', len(response))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def handle_get_stats(self):
+        """Return proxy runtime statistics (upstream connection reuse, rate limits, inventories)"""
+        data = {
+            'upstreamPool': upstream_pool.get_stats(),
+            'rateLimits': rate_limiters.get_stats(),
+            'inventories': device_inventories.get_stats(),
+            'migrations': migration_journal.get_stats(),
+            'proxyCache': proxy_cache.get_stats(),
+            'grpc': grpc_backend.get_stats(),
+            'linkMetrics': link_metrics.get_stats()
+        }
         response = json.dumps(data).encode('utf-8')
         self.send_response(200)
         self.send_header('Content-Type', 'application/json')
@@ -134,9 +3092,89 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             self.handle_create_profile()
         elif self.path == '/api/servers':
             self.handle_create_server()
+        elif self.path == '/api/import':
+            self.run_long_request(self.handle_import)
+        elif self.path == '/api/import/plan':
+            self.handle_import_plan()
+        elif self.path == '/api/parse' or self.path.startswith('/api/parse?'):
+            self.handle_parse()
+        elif self.path == '/api/export':
+            self.handle_create_export()
+        elif self.path == '/api/jobs':
+            self.handle_create_job()
+        elif self.path.startswith('/api/jobs/'):
+            self.handle_job_action()
         else:
             self.send_error(404)
 
+    def handle_parse(self):
+        """POST /api/parse?format=csv|xlsx[&separator=;] - stream an uploaded file back as NDJSON.
+
+        Lines: {"type": "header", "headers": [...], "separator": ";"}, then {"type": "rows",
+        "rows": [[...], ...]} every PARSE_CHUNK_ROWS rows, then {"type": "end", "rows": N}
+        (or {"type": "error", "error": "..."}). Empty rows are skipped, cells are trimmed.
+        """
+        query = parse_qs(urlparse(self.path).query)
+        file_format = query.get('format', ['csv'])[0]
+        separator = query.get('separator', [''])[0]
+        if file_format not in ('csv', 'xlsx'):
+            self.send_json_error(400, 'format must be csv or xlsx')
+            return
+        if separator in ('', 'auto'):
+            separator = None
+        elif separator not in PARSE_SEPARATORS:
+            self.send_json_error(400, 'Unsupported separator')
+            return
+
+        # The whole upload is received before answering: a client still sending its body
+        # does not read the response yet, so streaming both ways could fill both socket
+        # buffers and deadlock. The upload goes to disk, memory stays flat.
+        spool = tempfile.TemporaryFile()
+        shutil.copyfileobj(RequestBodyReader(self.rfile, int(self.headers.get('Content-Length', 0))), spool)
+        spool.seek(0)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        def send(message):
+            self.wfile.write(json.dumps(message).encode('utf-8') + b'\n')
+
+        try:
+            if file_format == 'xlsx':
+                rows = iter_xlsx_rows(spool)
+            else:
+                separator, rows = open_csv_rows(spool, separator)
+
+            headers = None
+            chunk = []
+            count = 0
+            for values in rows:
+                values = [value.replace('\r', ' ').replace('\n', ' ').strip() for value in values]
+                if not any(values):
+                    continue
+                if headers is None:
+                    headers = values
+                    send({'type': 'header', 'headers': headers, 'separator': separator})
+                    continue
+                chunk.append(values)
+                count += 1
+                if len(chunk) >= PARSE_CHUNK_ROWS:
+                    send({'type': 'rows', 'rows': chunk})
+                    chunk = []
+            if chunk:
+                send({'type': 'rows', 'rows': chunk})
+            if headers is None:
+                send({'type': 'header', 'headers': [], 'separator': separator})
+            send({'type': 'end', 'rows': count})
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Browser gave up (new file or separator selected)
+        except (csv.Error, zipfile.BadZipFile, ET.ParseError, KeyError, IndexError, ValueError) as e:
+            send({'type': 'error', 'error': f"{type(e).__name__}: {e}"})
+        finally:
+            spool.close()
+
     def handle_create_profile(self):
         """Create a new profile"""
         content_length = int(self.headers.get('Content-Length', 0))
@@ -152,7 +3190,6 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             self.send_json_error(400, 'Profile name is required')
             return
 
-        data = load_profiles()
         now = datetime.utcnow().isoformat() + 'Z'
 
         new_profile = {
@@ -163,8 +3200,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             'updatedAt': now
         }
 
-        data['profiles'].append(new_profile)
-        save_profiles(data)
+        profile_store.add(new_profile)
 
         response = json.dumps(new_profile).encode('utf-8')
         self.send_response(201)
@@ -188,15 +3224,8 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             self.send_json_error(400, 'Server name and URL are required')
             return
 
-        data = load_servers()
         now = datetime.utcnow().isoformat() + 'Z'
 
-        # Check if URL already exists
-        for server in data['servers']:
-            if server['url'] == server_data['url']:
-                self.send_json_error(409, 'Server URL already exists')
-                return
-
         new_server = {
             'id': str(uuid.uuid4()),
             'name': server_data['name'],
@@ -204,8 +3233,10 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             'createdAt': now
         }
 
-        data['servers'].append(new_server)
-        save_servers(data)
+        # The URL check and the insertion happen under the same lock
+        if not server_store.add(new_server, unique_field='url'):
+            self.send_json_error(409, 'Server URL already exists')
+            return
 
         response = json.dumps(new_server).encode('utf-8')
         self.send_response(201)
@@ -214,6 +3245,456 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(response)
 
+    def handle_import(self):
+        """Create devices + keys server-side with bounded parallelism, one result per row.
+
+        With "existing": "update" or "skip" and an "applicationId", rows are first
+        reconciled with the application (plan_import): existing devices are updated
+        in place only where they differ, or skipped.
+        """
+        client = self.get_chirpstack_client()
+        if client is None:
+            return
+        payload = self.read_json_body()
+        if payload is None:
+            return
+
+        items = payload.get('devices')
+        if not isinstance(items, list):
+            self.send_json_error(400, 'devices (list) is required')
+            return
+        existing = payload.get('existing')
+        if existing is not None and (existing not in ('update', 'skip') or not payload.get('applicationId')):
+            self.send_json_error(400, 'existing must be update or skip, with an applicationId')
+            return
+
+        concurrency = clamp_concurrency(payload.get('concurrency'))
+        started = time.monotonic()
+        if existing:
+            try:
+                plan = plan_import(client, payload['applicationId'], items, concurrency)
+            except ChirpStackError as e:
+                self.send_json_error(e.status, e.message)
+                return
+            results = bounded_map(lambda pair: apply_import_plan(client, pair[0], pair[1], existing),
+                                  zip(items, plan), concurrency)
+        else:
+            results = bounded_map(lambda item: import_device(client, item), items, concurrency)
+
+        success = sum(1 for r in results if r['status'] != 'error')
+        self.send_json(200, {
+            'total': len(results),
+            'success': success,
+            'errors': len(results) - success,
+            'concurrency': concurrency,
+            'durationMs': int((time.monotonic() - started) * 1000),
+            'results': results
+        })
+
+    def handle_import_plan(self):
+        """POST /api/import/plan {applicationId, devices} - what an import with existing=update would do.
+
+        Rows: {row, devEui, name, existingName, action: create | unchanged | update,
+        fields: [changed fields], keys: bool}, plus the count of each kind.
+        """
+        client = self.get_chirpstack_client()
+        if client is None:
+            return
+        payload = self.read_json_body()
+        if payload is None:
+            return
+        items = payload.get('devices')
+        if not isinstance(items, list) or not payload.get('applicationId'):
+            self.send_json_error(400, 'applicationId and devices (list) are required')
+            return
+
+        try:
+            plan = plan_import(client, payload['applicationId'], items, clamp_concurrency(payload.get('concurrency')))
+        except ChirpStackError as e:
+            self.send_json_error(e.status, e.message)
+            return
+        rows = []
+        for item, entry in zip(items, plan):
+            device = item.get('device') or {}
+            dev_eui = (device.get('dev_eui') or device.get('devEui') or '').lower()
+            rows.append({
+                'row': item.get('row'), 'devEui': dev_eui, 'name': device.get('name') or dev_eui,
+                'existingName': (entry['existing'] or {}).get('name'),
+                'action': entry['action'], 'fields': entry['fields'], 'keys': entry['keys']
+            })
+        self.send_json(200, {
+            'total': len(rows),
+            'create': sum(1 for r in rows if r['action'] == 'create'),
+            'unchanged': sum(1 for r in rows if r['action'] == 'unchanged'),
+            'updateFields': sum(1 for r in rows if r['fields']),
+            'updateKeys': sum(1 for r in rows if r['keys']),
+            'rows': rows
+        })
+
+    def get_job_from_path(self):
+        """Return (job, action) for /api/jobs/{id}[/{action}] (sends 404 if unknown)"""
+        parts = urlparse(self.path).path.split('/')[3:]
+        job = job_manager.get(parts[0]) if parts else None
+        if job is None:
+            self.send_json_error(404, 'Job not found')
+            return None, None
+        return job, (parts[1] if len(parts) > 1 else '')
+
+    def handle_create_job(self):
+        """Queue a background bulk operation: {kind, items, params, concurrency}"""
+        client = self.get_chirpstack_client()
+        if client is None:
+            return
+        payload = self.read_json_body()
+        if payload is None:
+            return
+
+        kind = payload.get('kind')
+        if kind not in JOB_HANDLERS:
+            self.send_json_error(400, f"Unknown job kind (expected one of: {', '.join(JOB_HANDLERS)})")
+            return
+        items = payload.get('items')
+        if not isinstance(items, list):
+            self.send_json_error(400, 'items (list) is required')
+            return
+        params = payload.get('params') or {}
+        missing = [p for p in JOB_HANDLERS[kind][1] if not params.get(p)]
+        if missing:
+            self.send_json_error(400, f"Missing params: {', '.join(missing)}")
+            return
+        existing = params.get('existing')
+        if kind == 'import' and existing is not None and (existing not in ('update', 'skip') or not params.get('applicationId')):
+            self.send_json_error(400, 'existing must be update or skip, with an applicationId')
+            return
+
+        job = job_manager.submit(kind, client.base_url, client.auth_header, params, items,
+                                 clamp_concurrency(payload.get('concurrency')))
+        self.send_json(201, job.summary())
+
+    def handle_get_jobs(self):
+        """GET /api/jobs, /api/jobs/{id}[?from=N] (polling) or /api/jobs/{id}/events (SSE)"""
+        if urlparse(self.path).path.rstrip('/') == '/api/jobs':
+            self.send_json(200, {'jobs': job_manager.list()})
+            return
+        job, action = self.get_job_from_path()
+        if job is None:
+            return
+        if action == 'events':
+            self.run_long_request(lambda: self.handle_job_events(job), event_stream=True)
+            return
+        if action:
+            self.send_error(404)
+            return
+
+        query = parse_qs(urlparse(self.path).query)
+        start = parse_position(query.get('from', ['0'])[0])
+        if start is None:
+            self.send_json_error(400, 'from must be a non-negative integer')
+            return
+        data = job.summary()
+        with job.condition:
+            data['results'] = job.results[start:]
+        self.send_json(200, data)
+
+    def handle_get_inventory(self):
+        """GET /api/inventory?applicationId=...[&q=&deviceProfileId=&tag=k=v&devEui=&sort=&order=&offset=&limit=&refresh=1]"""
+        query = parse_qs(urlparse(self.path).query)
+        application_id = query.get('applicationId', [''])[0]
+        if not application_id:
+            self.send_json_error(400, 'applicationId is required')
+            return
+        client = self.get_chirpstack_client()
+        if client is None:
+            return
+
+        try:
+            inventory, cached = device_inventories.get(client, application_id,
+                                                       refresh=query.get('refresh', [''])[0] == '1')
+        except ChirpStackError as e:
+            self.send_json_error(e.status, e.message)
+            return
+
+        dev_eui = query.get('devEui', [''])[0].lower()
+        if dev_eui:
+            with inventory.lock:
+                device = inventory.devices.get(dev_eui)
+            devices = [device] if device else []
+        else:
+            devices = inventory.snapshot()
+        try:
+            total, page = query_inventory(devices, query)
+        except ValueError:
+            self.send_json_error(400, 'Invalid offset or limit')
+            return
+        self.send_json(200, {
+            'totalCount': total,
+            'result': page,
+            'applicationId': application_id,
+            'loadedAt': inventory.loaded_at,
+            'cached': cached
+        })
+
+    def handle_search(self):
+        """GET /api/search?tenantId=...&q=...[&limit=50] - DevEUI/name lookup across the tenant"""
+        query = parse_qs(urlparse(self.path).query)
+        tenant_id = query.get('tenantId', [''])[0]
+        text = query.get('q', [''])[0].strip()
+        if not tenant_id or not text:
+            self.send_json_error(400, 'tenantId and q are required')
+            return
+        try:
+            limit = max(1, min(int(query.get('limit', ['50'])[0]), SEARCH_MAX_RESULTS))
+        except ValueError:
+            self.send_json_error(400, 'Invalid limit')
+            return
+        client = self.get_chirpstack_client()
+        if client is None:
+            return
+
+        index = search_indexes.get(client, tenant_id)
+        started = time.perf_counter()
+        results = index.search(text, limit)
+        data = index.get_status()
+        data.update({'result': results, 'tookMs': round((time.perf_counter() - started) * 1000, 3)})
+        self.send_json(200, data)
+
+    def handle_dashboard(self):
+        """GET /api/dashboard?tenantId=...[&refresh=1] - device and gateway counters of a tenant"""
+        query = parse_qs(urlparse(self.path).query)
+        tenant_id = query.get('tenantId', [''])[0]
+        if not tenant_id:
+            self.send_json_error(400, 'tenantId is required')
+            return
+        client = self.get_chirpstack_client()
+        if client is None:
+            return
+        try:
+            data, cached = tenant_dashboards.get(client, tenant_id, refresh=query.get('refresh', [''])[0] == '1')
+        except ChirpStackError as e:
+            self.send_json_error(e.status, e.message)
+            return
+        self.send_json(200, dict(data, cached=cached))
+
+    def handle_link_metrics(self):
+        """GET /api/link-metrics?applicationId=...&period=24h|7d[&sort=loss|rssi|snr|errors&limit=N]
+        - worst devices of an application from the collected link metrics (job 'link-metrics'),
+        or [&devEui=...] - hourly series of one device (404 if not collected in the last hour)
+        """
+        query = parse_qs(urlparse(self.path).query)
+        application_id = query.get('applicationId', [''])[0]
+        period = query.get('period', ['24h'])[0]
+        sort = query.get('sort', ['loss'])[0]
+        if not application_id:
+            self.send_json_error(400, 'applicationId is required')
+            return
+        if period not in LINK_METRICS_PERIODS or sort not in LINK_METRICS_SORTS:
+            self.send_json_error(400, f"period: {', '.join(LINK_METRICS_PERIODS)} / sort: {', '.join(LINK_METRICS_SORTS)}")
+            return
+        client = self.get_chirpstack_client()
+        if client is None:
+            return
+        hours = LINK_METRICS_PERIODS[period]
+
+        dev_eui = query.get('devEui', [''])[0]
+        if dev_eui:
+            series = link_metrics.series(client.base_url, application_id, dev_eui, hours)
+            if series is None or parse_timestamp(series['lastHour']) < (current_hour() - 1) * 3600:
+                self.send_json_error(404, 'No recent link metrics for this device')
+                return
+            self.send_json(200, series)
+            return
+
+        try:
+            limit = max(0, int(query.get('limit', ['100'])[0]))
+        except ValueError:
+            limit = 100
+        rows, collected_at = link_metrics.summary(client.base_url, application_id, hours)
+        measured = [row for row in rows if row['hours']]
+        worst = {
+            'loss': lambda row: -row['loss'] if row['loss'] is not None else 1,
+            'rssi': lambda row: row['rssiAvg'] if row['rssiAvg'] is not None else math.inf,
+            'snr': lambda row: row['snrAvg'] if row['snrAvg'] is not None else math.inf,
+            'errors': lambda row: -row['errors'],
+        }[sort]
+        fleet = {
+            'devices': len(measured),
+            'rx': sum(row['rx'] for row in measured),
+            'errors': sum(row['errors'] for row in measured),
+            'silent': sum(1 for row in measured if not row['rx']),
+            'rssiMin': min((row['rssiMin'] for row in measured if row['rssiMin'] is not None), default=None),
+            'snrMin': min((row['snrMin'] for row in measured if row['snrMin'] is not None), default=None),
+        }
+        self.send_json(200, {
+            'applicationId': application_id, 'period': period, 'sort': sort,
+            'collectedAt': collected_at, 'fleet': fleet, 'total': len(measured),
+            'devices': sorted(measured, key=worst)[:limit]
+        })
+
+    def handle_metrics(self):
+        """GET /metrics - proxy and upstream metrics in Prometheus text format"""
+        response = proxy_metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', len(response))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def handle_create_export(self):
+        """POST /api/export {applicationId, format, keys, filters...} - one-time download URL for the browser"""
+        client = self.get_chirpstack_client()
+        if client is None:
+            return
+        payload = self.read_json_body()
+        if payload is None:
+            return
+        if not payload.get('applicationId'):
+            self.send_json_error(400, 'applicationId is required')
+            return
+        query = {key: [str(value)] for key, value in payload.items() if value not in (None, '', False)}
+        ticket = export_tickets.create(client, query)
+        self.send_json(200, {'url': f'/api/export?ticket={ticket}', 'expiresIn': EXPORT_TICKET_TTL})
+
+    def handle_export(self):
+        """GET /api/export?applicationId=...&format=csv|xlsx[&keys=1&deviceProfileId=&activity=&tag=&filename=]
+        (ChirpStack headers required) or GET /api/export?ticket=... - stream the export file.
+
+        Devices come from the inventory cache, keys are fetched EXPORT_KEY_CONCURRENCY at a
+        time and rows are written as soon as they are ready. HTTP/1.1 clients get a chunked
+        body, so an export that fails partway is seen as an incomplete download; HTTP/1.0
+        ones a body delimited by closing the connection.
+        """
+        query = parse_qs(urlparse(self.path).query)
+        ticket = query.get('ticket', [''])[0]
+        if ticket:
+            entry = export_tickets.take(ticket)
+            if entry is None:
+                self.send_json_error(404, 'Unknown or expired export link')
+                return
+            client, query = entry
+        else:
+            client = self.get_chirpstack_client()
+            if client is None:
+                return
+
+        application_id = query.get('applicationId', [''])[0]
+        file_format = query.get('format', ['csv'])[0]
+        if not application_id or file_format not in ('csv', 'xlsx'):
+            self.send_json_error(400, 'applicationId and format=csv|xlsx are required')
+            return
+        include_keys = query.get('keys', [''])[0] in ('1', 'true', 'True')
+
+        try:
+            inventory, _ = device_inventories.get(client, application_id)
+        except ChirpStackError as e:
+            self.send_json_error(e.status, e.message)
+            return
+        all_devices = inventory.snapshot()
+        tag_keys = sorted({key for d in all_devices for key in (d.get('tags') or {})})
+        devices = filter_devices(all_devices, query)
+
+        filename = query.get('filename', [f'export_{application_id}.{file_format}'])[0]
+        ascii_name = re.sub(r'[^A-Za-z0-9._-]', '_', filename)
+        chunked = self.request_version == 'HTTP/1.1'
+        if chunked:
+            self.protocol_version = 'HTTP/1.1'  # This response only: chunked coding needs HTTP/1.1
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv; charset=utf-8' if file_format == 'csv' else
+                         'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        self.send_header('Content-Disposition',
+                         f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}")
+        self.send_header('Cache-Control', 'no-store')
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        out = ChunkedWriter(self.wfile) if chunked else self.wfile
+        rows = export_table(client, devices, tag_keys, include_keys)
+        try:
+            if file_format == 'xlsx':
+                write_xlsx_export(out, rows)
+            else:
+                write_csv_export(out, rows)
+            if chunked:
+                out.finish()  # Only written once the whole file is
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Download cancelled
+        finally:
+            rows.close()
+        self.close_connection = True
+
+    def handle_invalidate_inventory(self):
+        """DELETE /api/inventory[?applicationId=...] - drop cached device lists of this server"""
+        base_url = self.headers.get('X-Chirpstack-Url', '').strip().rstrip('/')
+        if not base_url:
+            self.send_json_error(400, 'X-Chirpstack-Url header is required')
+            return
+        application_id = parse_qs(urlparse(self.path).query).get('applicationId', [None])[0]
+        self.send_json(200, {'invalidated': device_inventories.invalidate(base_url, application_id)})
+
+    def handle_job_events(self, job):
+        """Server-Sent Events feed: one 'result' event per finished item, 'progress', then 'end'.
+
+        Event ids are positions in the result list: a reconnecting EventSource sends
+        Last-Event-ID and only receives what it missed.
+        """
+        query = parse_qs(urlparse(self.path).query)
+        last_event_id = self.headers.get('Last-Event-ID')
+        if last_event_id:
+            position = parse_position(last_event_id)
+            position = position + 1 if position is not None else None
+        else:
+            position = parse_position(query.get('from', ['0'])[0])
+        if position is None:
+            self.send_json_error(400, 'Last-Event-ID and from must be non-negative integers')
+            return
+
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        last_progress = 0
+        try:
+            while True:
+                results, finished = job.wait_results(position, timeout=15)
+                chunks = []
+                for result in results:
+                    chunks.append(f"id: {position}\nevent: result\ndata: {json.dumps(result)}\n\n")
+                    position += 1
+                # Progress doubles as keep-alive; throttled when no result was sent
+                now = time.monotonic()
+                if results or finished or now - last_progress >= 1:
+                    chunks.append(f"event: progress\ndata: {json.dumps(job.summary())}\n\n")
+                    last_progress = now
+                if finished and not results:
+                    chunks.append(f"event: end\ndata: {json.dumps(job.summary())}\n\n")
+                if chunks:
+                    self.wfile.write(''.join(chunks).encode('utf-8'))
+                    self.wfile.flush()
+                if (finished and not results) or job_manager.stopping:
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client went away: the job keeps running
+
+    def handle_job_action(self):
+        """POST /api/jobs/{id}/cancel or /api/jobs/{id}/resume"""
+        job, action = self.get_job_from_path()
+        if job is None:
+            return
+        if action == 'cancel':
+            job_manager.cancel(job)
+        elif action == 'resume':
+            if job.status not in ('interrupted', 'cancelled', 'failed'):
+                self.send_json_error(409, f"Job is {job.status}")
+                return
+            job_manager.resume(job, self.headers.get('Grpc-Metadata-Authorization', ''))
+        else:
+            self.send_error(404)
+            return
+        self.send_json(200, job.summary())
+
     def do_PUT(self):
         if self.path.startswith('/proxy/'):
             self.proxy_request('PUT')
@@ -235,27 +3716,19 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             self.send_json_error(400, 'Invalid JSON')
             return
 
-        data = load_profiles()
-        profile_found = False
-
-        for profile in data['profiles']:
-            if profile['id'] == profile_id:
-                profile['name'] = profile_data.get('name', profile['name'])
-                profile['requiredTags'] = profile_data.get('requiredTags', profile['requiredTags'])
-                profile['updatedAt'] = datetime.utcnow().isoformat() + 'Z'
-                profile_found = True
-
-                save_profiles(data)
-                response = json.dumps(profile).encode('utf-8')
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.send_header('Content-Length', len(response))
-                self.end_headers()
-                self.wfile.write(response)
-                break
-
-        if not profile_found:
+        changes = {key: profile_data[key] for key in ('name', 'requiredTags') if key in profile_data}
+        changes['updatedAt'] = datetime.utcnow().isoformat() + 'Z'
+        profile = profile_store.update(profile_id, changes)
+        if profile is None:
             self.send_json_error(404, 'Profile not found')
+            return
+
+        response = json.dumps(profile).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', len(response))
+        self.end_headers()
+        self.wfile.write(response)
 
     def do_DELETE(self):
         if self.path.startswith('/proxy/'):
@@ -264,6 +3737,10 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             self.handle_delete_profile()
         elif self.path.startswith('/api/servers/'):
             self.handle_delete_server()
+        elif self.path.startswith('/api/jobs/'):
+            self.handle_delete_job()
+        elif self.path == '/api/inventory' or self.path.startswith('/api/inventory?'):
+            self.handle_invalidate_inventory()
         else:
             self.send_error(404)
 
@@ -271,15 +3748,10 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         """Delete a profile"""
         profile_id = self.path.split('/api/profiles/')[-1]
 
-        data = load_profiles()
-        original_length = len(data['profiles'])
-        data['profiles'] = [p for p in data['profiles'] if p['id'] != profile_id]
-
-        if len(data['profiles']) == original_length:
+        if not profile_store.delete(profile_id):
             self.send_json_error(404, 'Profile not found')
             return
 
-        save_profiles(data)
         response = json.dumps({'success': True}).encode('utf-8')
         self.send_response(200)
         self.send_header('Content-Type', 'application/json')
@@ -291,15 +3763,10 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         """Delete a saved server"""
         server_id = self.path.split('/api/servers/')[-1]
 
-        data = load_servers()
-        original_length = len(data['servers'])
-        data['servers'] = [s for s in data['servers'] if s['id'] != server_id]
-
-        if len(data['servers']) == original_length:
+        if not server_store.delete(server_id):
             self.send_json_error(404, 'Server not found')
             return
 
-        save_servers(data)
         response = json.dumps({'success': True}).encode('utf-8')
         self.send_response(200)
         self.send_header('Content-Type', 'application/json')
@@ -307,6 +3774,74 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(response)
 
+    def get_chirpstack_client(self):
+        """Build a ChirpStack client from the X-Chirpstack-Url and auth headers (sends 400 if missing)"""
+        base_url = self.headers.get('X-Chirpstack-Url', '').strip()
+        if not (base_url.startswith('http://') or base_url.startswith('https://')):
+            self.send_json_error(400, 'X-Chirpstack-Url header (http:// or https://) is required')
+            return None
+        return ChirpStackClient(base_url, self.headers.get('Grpc-Metadata-Authorization', ''))
+
+    def read_json_body(self):
+        """Read and decode the JSON request body (sends 400 and returns None if invalid)"""
+        content_length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(content_length)
+        try:
+            data = json.loads(body.decode('utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            self.send_json_error(400, 'Invalid JSON')
+            return None
+        if not isinstance(data, dict):
+            self.send_json_error(400, 'Invalid JSON')
+            return None
+        return data
+
+    def send_json(self, code, data):
+        """Send a JSON response (compressed if large enough)"""
+        self.send_response(code)
+        self.write_body(json.dumps(data).encode('utf-8'))
+
+    def handle_delete_job(self):
+        """Delete a finished job and its journal"""
+        job, action = self.get_job_from_path()
+        if job is None:
+            return
+        if job.status not in JOB_FINAL_STATUSES:
+            self.send_json_error(409, f"Job is {job.status}, cancel it first")
+            return
+        job_manager.delete(job)
+        self.send_json(200, {'success': True})
+
+    def run_long_request(self, handler, event_stream=False):
+        """Run a handler that holds its connection for long (job SSE, streamed export,
+        synchronous import) in one of the MAX_STREAMS slots, so that open tabs cannot
+        take the workers ordinary requests need. When every slot is taken the client is
+        told to come back later: 503 + Retry-After, or a `retry` hint for EventSource,
+        which then reconnects by itself (and resumes with Last-Event-ID).
+        """
+        if stream_slots.acquire(blocking=False):
+            try:
+                handler()
+            finally:
+                stream_slots.release()
+            return
+        if event_stream:
+            self.send_response(200)
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            self.wfile.write(f"retry: {STREAM_RETRY_DELAY * 1000}\n\n".encode('utf-8'))
+            self.close_connection = True
+            return
+        response = json.dumps({'error': f'Too many long-running requests (max {MAX_STREAMS}), retry later'}).encode('utf-8')
+        self.send_response(503)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', len(response))
+        self.send_header('Retry-After', str(STREAM_RETRY_DELAY))
+        self.end_headers()
+        self.wfile.write(response)
+
     def send_json_error(self, code, message):
         """Send a JSON error response"""
         response = json.dumps({'error': message}).encode('utf-8')
@@ -331,43 +3866,56 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                 self.send_error(400, 'Invalid proxy URL format')
                 return
 
-            # Read request body for POST/PUT
+            # Read request body for POST/PUT (large ones are streamed upstream instead)
             content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length) if content_length > 0 else None
-
-            # Build the proxied request
-            req = urllib.request.Request(target_url, data=body, method=method)
+            if content_length > PROXY_CHUNK_SIZE:
+                body = BoundedReader(self.rfile, content_length)
+            else:
+                body = self.rfile.read(content_length) if content_length > 0 else None
 
             # Forward relevant headers
-            req.add_header('Accept', 'application/json')
+            headers = {'Accept': 'application/json'}
             auth_header = self.headers.get('Grpc-Metadata-Authorization', '')
             if auth_header:
-                req.add_header('Grpc-Metadata-Authorization', auth_header)
+                headers['Grpc-Metadata-Authorization'] = auth_header
             if 'Content-Type' in self.headers:
-                req.add_header('Content-Type', self.headers['Content-Type'])
-
-            # Make the request
-            with urllib.request.urlopen(req, timeout=30) as response:
-                response_body = response.read()
-
+                headers['Content-Type'] = self.headers['Content-Type']
+            streamed_body = isinstance(body, BoundedReader)
+            if streamed_body:
+                headers['Content-Length'] = str(content_length)
+
+            # gRPC or cache if they handle the call, else a pooled keep-alive connection
+            # whose response is relayed as it arrives
+            cache_status = None
+            stream = None
+            response = grpc_backend.request(method, target_url, body, auth_header) if not streamed_body else None
+            if response is None and method == 'GET' and proxy_cache.cacheable(target_url):
+                response, cache_status = proxy_cache.fetch(target_url, headers)
+            if response is None:
+                stream = response = upstream_pool.open(method, target_url, body=body, headers=headers)
+            with stream or contextlib.nullcontext():
+                if method != 'GET' and response.status < 400:
+                    device_inventories.observe(method, target_url, None if streamed_body else body)
+                    proxy_cache.observe(target_url)
+
+                # Error statuses (4xx/5xx) are forwarded as-is, like successful ones
                 self.send_response(response.status)
                 self.send_header('Access-Control-Allow-Origin', '*')
-                self.send_header('Content-Type', response.headers.get('Content-Type', 'application/json'))
-                self.send_header('Content-Length', len(response_body))
-                self.end_headers()
-                self.wfile.write(response_body)
-
-        except urllib.error.HTTPError as e:
-            error_body = e.read()
-            self.send_response(e.code)
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Content-Length', len(error_body))
-            self.end_headers()
-            self.wfile.write(error_body)
-
-        except urllib.error.URLError as e:
-            error_msg = json.dumps({'error': str(e.reason)}).encode()
+                if cache_status:
+                    self.send_header('Cache-Status', cache_status)
+                if stream is not None:
+                    self.write_stream(stream)
+                else:
+                    self.write_body(response.body, response.headers.get('Content-Type', 'application/json'),
+                                    response.encoded)
+
+        except (OSError, http.client.HTTPException) as e:
+            if self.response_status is not None:
+                # ChirpStack or the browser dropped the connection mid-body: nothing left to send
+                self.log_message('%s', f'Proxy stream interrupted: {e}')
+                self.close_connection = True
+                return
+            error_msg = json.dumps({'error': str(e)}).encode()
             self.send_response(502)
             self.send_header('Access-Control-Allow-Origin', '*')
             self.send_header('Content-Type', 'application/json')
@@ -376,6 +3924,10 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             self.wfile.write(error_msg)
 
         except Exception as e:
+            if self.response_status is not None:
+                self.log_message('%s', f'Proxy stream interrupted: {e}')
+                self.close_connection = True
+                return
             error_msg = json.dumps({'error': str(e)}).encode()
             self.send_response(500)
             self.send_header('Access-Control-Allow-Origin', '*')
@@ -389,11 +3941,55 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         print(f"[{self.log_date_time_string()}] {args[0]}")
 
 
-class ReusableTCPServer(socketserver.TCPServer):
+class ThreadPoolHTTPServer(socketserver.TCPServer):
+    """TCPServer that handles each connection in a bounded worker pool.
+
+    A slow ChirpStack call only occupies one worker, so static files,
+    /health and other tabs keep being served. The pool has MAX_STREAMS extra
+    threads for long-lived responses (capped by run_long_request), so those
+    never leave fewer than max_workers for the rest. server_close() waits for
+    in-flight requests to finish (graceful shutdown).
+    """
+
+    def __init__(self, server_address, handler_class, max_workers=MAX_WORKERS):
+        self.max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers + max(1, MAX_STREAMS),
+                                            thread_name_prefix='http')
+        super().__init__(server_address, handler_class)
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=True)
+
+
+class ReusableTCPServer(ThreadPoolHTTPServer):
     """TCPServer avec allow_reuse_address pour éviter les erreurs au redémarrage"""
     allow_reuse_address = True
 
 
+def install_shutdown_handler(httpd):
+    """Stop serve_forever() cleanly on SIGTERM (docker stop, systemd...)"""
+    def handle_sigterm(signum, frame):
+        # shutdown() blocks until serve_forever() returns: call it from another thread
+        threading.Thread(target=httpd.shutdown, daemon=True).start()
+
+    try:
+        signal.signal(signal.SIGTERM, handle_sigterm)
+    except (ValueError, AttributeError):
+        pass  # Not in main thread / platform without SIGTERM
+
+
 def main():
     # Change to app directory for serving static files
     app_dir = os.path.dirname(os.path.abspath(__file__)) or '.'
@@ -403,12 +3999,17 @@ def main():
     ensure_data_dir()
 
     with ReusableTCPServer((HOST, PORT), ProxyHandler) as httpd:
+        install_shutdown_handler(httpd)
+        job_manager.start()
+        if GRPC_TARGET and grpc is None:
+            print("[WARN] GRPC_TARGET ignore: installez grpcio et chirpstack-api (pip install grpcio chirpstack-api)")
         print("")
         print("=" * 50)
         print("  ChirpStack CSV Importer - Docker")
         print("=" * 50)
         print(f"  Serveur demarre sur: http://{HOST}:{PORT}")
         print(f"  Dossier de données: {DATA_DIR}")
+        print(f"  Requetes simultanees: {httpd.max_workers}")
         print("")
         print("  Health check: /health")
         print("  Appuyez sur Ctrl+C pour arreter")
@@ -417,7 +4018,11 @@ def main():
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
-            print("\nServeur arrêté.")
+            pass
+        print("\nArret en cours (fin des requetes en cours)...")
+        job_manager.stop()
+        link_metrics.flush()
+    print("Serveur arrêté.")
 
 
 if __name__ == '__main__':
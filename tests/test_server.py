@@ -0,0 +1,167 @@
+"""Tests of server.py against benchmark.FakeChirpStack (stdlib only).
+
+Run from the repository root: python -m unittest discover tests
+"""
+
+import http.client
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# server.py reads its configuration (and its port from sys.argv) at import time
+os.environ['DATA_DIR'] = tempfile.mkdtemp(prefix='chirpstack-tests-')
+os.environ['RATE_LIMIT_MAX'] = '0'
+sys.argv = sys.argv[:1]
+
+import benchmark  # noqa: E402
+import server  # noqa: E402
+
+AUTH = 'Bearer test'
+
+
+def setUpModule():
+    server.job_manager.start()
+
+
+def tearDownModule():
+    server.job_manager.stop()
+
+
+def import_row(i, dev_eui):
+    return {'row': i + 2,
+            'device': {'application_id': benchmark.APPLICATION_ID, 'name': f'device-{i}', 'description': '',
+                       'dev_eui': dev_eui, 'device_profile_id': benchmark.DEVICE_PROFILE_ID, 'tags': {}},
+            'keys': {'dev_eui': dev_eui, 'nwk_key': f'{i:032x}'}}
+
+
+class ChirpStackTestCase(unittest.TestCase):
+    """Starts a fake ChirpStack (no latency) per test"""
+
+    def setUp(self):
+        self.fake = benchmark.FakeChirpStack(latency=0)
+        self.url = self.fake.start()
+        self.client = server.ChirpStackClient(self.url, AUTH)
+
+    def tearDown(self):
+        self.fake.stop()
+
+    def add_devices(self, dev_euis, application_id=benchmark.APPLICATION_ID):
+        for dev_eui in dev_euis:
+            self.fake.route('POST', '/api/devices', {'device': {
+                'devEui': dev_eui, 'name': f'name-{dev_eui}', 'applicationId': application_id,
+                'deviceProfileId': benchmark.DEVICE_PROFILE_ID}})
+        self.fake.list_requests = 0
+
+    def run_job(self, kind, params, items, concurrency=8):
+        job = server.job_manager.submit(kind, self.url, AUTH, params, items, concurrency)
+        with job.condition:
+            while job.status not in server.JOB_FINAL_STATUSES:
+                job.condition.wait(10)
+        return job
+
+
+class ImportJobTest(ChirpStackTestCase):
+
+    def test_existing_mode_lists_the_application_once(self):
+        dev_euis = [f'{0x70B3D50000000000 + i:016x}' for i in range(200)]
+        self.add_devices(dev_euis[:100])
+        rows = [import_row(i, dev_eui) for i, dev_eui in enumerate(dev_euis)]
+
+        job = self.run_job('import', {'existing': 'skip', 'applicationId': benchmark.APPLICATION_ID}, rows)
+
+        self.assertEqual(job.status, 'completed')
+        statuses = sorted(r['status'] for r in job.results)
+        self.assertEqual(statuses, ['created'] * 100 + ['skipped'] * 100)
+        self.assertEqual(len(self.fake.devices), 200)
+        self.assertEqual(self.fake.list_requests, 1)  # 100 devices: one page
+
+
+class MigrateJobTest(ChirpStackTestCase):
+
+    def test_replay_of_migrated_device_only_restores_keys(self):
+        dev_eui = '70b3d50000000001'
+        self.add_devices([dev_eui], application_id='destination')
+        migrated = self.fake.devices[dev_eui]
+        keys = {'nwkKey': '0' * 32, 'appKey': ''}
+        # Left open by a previous attempt whose keys POST failed
+        server.migration_journal.record(dev_eui, {**migrated, 'applicationId': 'source'}, keys)
+
+        job = self.run_job('migrate', {'applicationId': 'destination'}, [{'devEui': dev_eui}])
+
+        self.assertEqual(job.results[0]['status'], 'success')
+        self.assertIs(self.fake.devices[dev_eui], migrated)  # Not deleted and recreated
+        self.assertEqual(self.fake.keys[dev_eui], keys)
+        self.assertIsNone(server.migration_journal.get(dev_eui))
+
+
+class QuietHandler(server.ProxyHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class ExportTest(ChirpStackTestCase):
+    """GET /api/export through a local server.py"""
+
+    def setUp(self):
+        super().setUp()
+        self.httpd = server.ThreadPoolHTTPServer(('127.0.0.1', 0), QuietHandler)
+        self.httpd.handle_error = lambda request, client_address: None  # Expected failures
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.add_devices([f'{0x70B3D50000000000 + i:016x}' for i in range(50)])
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        super().tearDown()
+
+    def get_export(self):
+        connection = http.client.HTTPConnection('127.0.0.1', self.httpd.server_address[1], timeout=10)
+        self.addCleanup(connection.close)
+        connection.request('GET', f'/api/export?applicationId={benchmark.APPLICATION_ID}&format=csv',
+                           headers={'Grpc-Metadata-Authorization': AUTH, 'X-Chirpstack-Url': self.url})
+        return connection.getresponse()
+
+    def test_export_is_chunked(self):
+        response = self.get_export()
+
+        self.assertEqual(response.getheader('Transfer-Encoding'), 'chunked')
+        self.assertEqual(response.read().count(b'\n'), 51)
+
+    def test_failed_export_is_incomplete(self):
+        def failing_table(*args):
+            yield server.EXPORT_COLUMNS
+            raise RuntimeError('ChirpStack went away')
+
+        with mock.patch.object(server, 'export_table', failing_table):
+            response = self.get_export()
+            with self.assertRaises(http.client.IncompleteRead):
+                response.read()
+
+
+class TenantSearchTest(unittest.TestCase):
+
+    def test_exact_deveui_in_last_application_ranks_first(self):
+        target = '70b3d5ffffff0001'
+        index = server.TenantSearchIndex('tenant')
+        index.segments = {
+            'app-1': server.SearchSegment({'id': 'app-1'}, [
+                {'devEui': f'{0x70B3D50000000000 + i:016x}', 'name': f'{target} copy {i}'} for i in range(20)
+            ], None),
+            'app-2': server.SearchSegment({'id': 'app-2'}, [{'devEui': target, 'name': 'original'}], None),
+        }
+
+        results = index.search(target.upper(), 10)
+
+        self.assertEqual(len(results), 10)
+        self.assertEqual(results[0]['devEui'], target)
+        self.assertEqual(results[0]['applicationId'], 'app-2')
+
+
+if __name__ == '__main__':
+    unittest.main()